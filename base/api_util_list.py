@@ -3,15 +3,16 @@
 
 
 from common.requests_util import SendRequest
+from common.extractor import compile_extract
+from common.response_util import wrap_response
 from common.parser_yaml import YmalParser
 from common.log_util import logs
 from conf.config_util import OperationConfig
-from common.assertions import Assertions
-from common.extract_util import ExtractUtil
+from common.assertions import Assertions, DbAssertBatch
+from common.attach_util import attach
+from common.template_util import template_engine
 import allure
 import json
-import jsonpath
-import re
 import traceback
 from json.decoder import JSONDecodeError
 
@@ -44,32 +45,10 @@ class RequestBase(object):
             logs.error(str(traceback.format_exc()))
 
     def replace_load(self, data):
-        """yaml数据替换解析"""
-        str_data = data
-        if not isinstance(data, str):
-            str_data = json.dumps(data, ensure_ascii=False)
-        for i in range(str_data.count('${')):
-            if '${' in str_data and '}' in str_data:
-                # index检测字符串是否子字符串，并找到字符串的索引位置
-                start_index = str_data.index('$')
-                end_index = str_data.index('}', start_index)
-                # yaml文件的参数，如：${get_yaml_data(loginname)}
-                ref_all_params = str_data[start_index:end_index + 1]
-                # 函数名，获取DebugUtil的方法
-                func_name = ref_all_params[2:ref_all_params.index("(")]
-                # 函数里的参数
-                func_params = ref_all_params[ref_all_params.index("(") + 1:ref_all_params.index(")")]
-                # 传入替换的参数获取对应的值,*func_params按,分割重新得到一个字符串
-                extract_data = getattr(ExtractUtil(), func_name)(*func_params.split(',') if func_params else "")
-                if extract_data and isinstance(extract_data, list):
-                    extract_data = ','.join(e for e in extract_data)
-                str_data = str_data.replace(ref_all_params, str(extract_data))
-        # 还原数据
+        """yaml数据替换解析，复用模板引擎的渲染计划，不做json序列化往返"""
+        data = template_engine.render(data)
         if data and isinstance(data, dict):
-            data = json.loads(str_data)
             self.handler_yaml_list(data)
-        else:
-            data = str_data
         return data
 
     def specification_yaml(self, case_info):
@@ -84,22 +63,26 @@ class RequestBase(object):
             base_url = self.conf.get_section_for_data('api_envi', 'host')
             # base_url = self.replace_load(case_info['baseInfo']['url'])
             url = base_url + case_info["baseInfo"]["url"]
-            allure.attach(url, '接口地址', allure.attachment_type.TEXT)
+            attach(url, '接口地址', allure.attachment_type.TEXT)
             api_name = case_info["baseInfo"]["api_name"]
-            allure.attach(api_name, '接口名称', allure.attachment_type.TEXT)
+            attach(api_name, '接口名称', allure.attachment_type.TEXT)
             base_method = case_info["baseInfo"].get("method")
             header = self.replace_load(case_info["baseInfo"]["header"])
-            allure.attach(str(header), '请求头信息', allure.attachment_type.TEXT)
+            attach(str(header), '请求头信息', allure.attachment_type.TEXT)
             try:
                 cookie = self.replace_load(case_info["baseInfo"]["cookies"])
-                allure.attach(str(cookie), 'Cookie', allure.attachment_type.TEXT)
+                attach(str(cookie), 'Cookie', allure.attachment_type.TEXT)
             except:
                 pass
+            # scenario模式下整个场景的db断言在场景结束时合并为一次查询
+            db_batch = DbAssertBatch() if assert_res.db_assert_mode == 'scenario' else None
             for tc in case_info["testCase"]:
+                # 浅拷贝，用例数据由get_testcase_yaml缓存复用，执行过程中的pop和参数替换不能修改原始数据
+                tc = dict(tc)
                 case_name = tc.pop("case_name")
-                allure.attach(case_name, '测试用例名称', allure.attachment_type.TEXT)
+                attach(case_name, '测试用例名称', allure.attachment_type.TEXT)
                 case_method = tc.pop('method', base_method)
-                allure.attach(str(case_method), '请求方法', allure.attachment_type.TEXT)
+                attach(str(case_method), '请求方法', allure.attachment_type.TEXT)
                 # 断言结果解析替换
                 validation_raw = tc.pop('validation', None)
                 if validation_raw is not None:
@@ -109,7 +92,7 @@ class RequestBase(object):
                 else:
                     validation = []
                     allure_validation = '[]'
-                allure.attach(allure_validation, "预期结果", allure.attachment_type.TEXT)
+                attach(allure_validation, "预期结果", allure.attachment_type.TEXT)
                 extract = tc.pop('extract', None)
                 extract_lst = tc.pop('extract_list', None)
                 for key, value in tc.items():
@@ -118,7 +101,7 @@ class RequestBase(object):
                 file, files = tc.pop("files", None), None
                 if file is not None:
                     for fk, fv in file.items():
-                        allure.attach(json.dumps(file), '导入文件')
+                        attach(file, '导入文件')
                         files = {fk: open(fv, 'rb')}
                 res = self.run.run_main(name=api_name,
                                         url=url,
@@ -127,7 +110,8 @@ class RequestBase(object):
                                         cookies=cookie,
                                         method=case_method,
                                         files=files, **tc)
-                res_text = res.text
+                # 统一包装，响应体只解析一次，提取和断言共用同一份数据
+                res = wrap_response(res)
                 status_code = res.status_code
                 raw_headers = getattr(res, 'headers', {})
                 response_headers = {}
@@ -140,26 +124,28 @@ class RequestBase(object):
                 except JSONDecodeError:
                     res_body = None
                 if response_headers:
-                    allure.attach(json.dumps(response_headers, ensure_ascii=False, indent=4),
-                                  '响应头', allure.attachment_type.TEXT)
+                    attach(response_headers, '响应头', allure.attachment_type.TEXT)
 
                 try:
                     if res_body is not None:
                         res_json = res_body
-                        if extract is not None:
-                            self.extract_data(extract, res_text)
-                        if extract_lst is not None:
-                            self.extract_data_list(extract_lst, res_text)
+                        if extract is not None or extract_lst is not None:
+                            self.extract_response(res, extract=extract, extract_list=extract_lst)
                     else:
                         res_json = {}
                     # 处理断言
-                    assert_res.assert_result(validation, res_json, headers=response_headers)
+                    assert_res.assert_result(validation, res_json, headers=response_headers,
+                                             case_name=case_name, db_batch=db_batch, timing=res.timing)
                 except JSONDecodeError as js:
                     logs.error("系统异常或接口未请求！")
                     raise js
                 except Exception as e:
                     logs.error(str(traceback.format_exc()))
                     raise e
+            if db_batch is not None:
+                failed = db_batch.flush()
+                if failed:
+                    raise AssertionError('数据库断言失败：\n' + '\n'.join(f'【{name}】{sql}' for name, sql in failed))
         except Exception as e:
             logs.error(e)
             raise e
@@ -176,75 +162,31 @@ class RequestBase(object):
         """
         提取接口的返回值，支持正则表达式和json提取器
         :param testcase_extarct: testcase文件yaml中的extract值
-        :param response: 接口的实际返回值
+        :param response: 接口的实际返回值，ResponseWrapper或响应文本
         :return:
         """
-        try:
-            pattern_lst = [r'(\d+)', r'(\d*)', '(.*?)', '(.+?)']
-            for key, value in testcase_extarct.items():
-                extracted = None
-
-                # ---- 正则提取 ----
-                is_regex = any(pat in value for pat in pattern_lst) or bool(re.search(r'\(.+?\)', value))
-                if is_regex and not value.strip().startswith('$'):
-                    m = re.search(value, response, re.S)
-                    if m:
-                        grp = m.group(1)
-                        # 若捕获到的是纯数字，尽量转成 int
-                        extracted = safe_to_int(grp)
-                        self.yml_parser.write_yaml_data({key: extracted})
-                        continue  # 单值提取完成
-
-                # ---- JSONPath 提取（以 $ 开头的表达式视为 JSONPath）----
-                if '$' in value:
-                    try:
-                        parsed = json.loads(response)
-                        jp = jsonpath.jsonpath(parsed, value)  # 命中返回 list，未命中返回 False/None
-                        if isinstance(jp, list) and len(jp) > 0:
-                            extracted = jp[0]
-                            self.yml_parser.write_yaml_data({key: extracted})
-                        else:
-                            self.yml_parser.write_yaml_data({key: f'未提取到数据，JSONPath无结果: {value}'})
-                    except Exception as e:
-                        logs.error(f'JSONPath 提取失败: {e}')
-                        self.yml_parser.write_yaml_data({key: f'未提取到数据，响应非JSON或JSONPath异常: {value}'})
-        except Exception as e:
-            logs.error(e)
+        self.extract_response(response, extract=testcase_extarct)
 
     def extract_data_list(self, testcase_extract_list, response):
         """
         提取多个参数，支持正则表达式和json提取，提取结果以列表形式返回
         :param testcase_extract_list: yaml文件中的extract_list信息
-        :param response: 接口的实际返回值,str类型
+        :param response: 接口的实际返回值，ResponseWrapper或响应文本
+        :return:
+        """
+        self.extract_response(response, extract_list=testcase_extract_list)
+
+    def extract_response(self, response, extract=None, extract_list=None):
+        """
+        按预编译的提取规则一次性提取extract和extract_list，JSONPath按公共前缀合并后一起求值
+        :param response: 接口的实际返回值，ResponseWrapper或响应文本
+        :param extract: yaml文件中的extract信息
+        :param extract_list: yaml文件中的extract_list信息
         :return:
         """
         try:
-            for key, value in testcase_extract_list.items():
-                # ---- 正则多值：任意捕获组都可（更通用），findall 返回列表 ----
-                if bool(re.search(r'\(.+?\)', value)) and not value.strip().startswith('$'):
-                    try:
-                        ext_list = re.findall(value, response, re.S)
-                        if ext_list:
-                            # 尝试把纯数字元素转 int，其余保持原样
-                            normalized = [safe_to_int(x) for x in ext_list]
-                            self.yml_parser.write_yaml_data({key: normalized})
-                            logs.info('正则提取到的参数：%s' % {key: normalized})
-                    except Exception as e:
-                        logs.error(f'正则提取异常: {e}')
-                # ---- JSONPath 多值 ----
-                if "$" in value:
-                    try:
-                        parsed = json.loads(response)
-                        ext_json = jsonpath.jsonpath(parsed, value)
-                        if isinstance(ext_json, list) and len(ext_json) > 0:
-                            self.yml_parser.write_yaml_data({key: ext_json})
-                            logs.info('json提取到参数：%s' % {key: ext_json})
-                        else:
-                            self.yml_parser.write_yaml_data({key: "未提取到数据，该接口返回结果可能为空"})
-                            logs.info('json提取为空：%s' % {key: value})
-                    except Exception as e:
-                        logs.error(f'JSONPath 提取失败: {e}')
-                        self.yml_parser.write_yaml_data({key: f'未提取到数据，响应非JSON或JSONPath异常: {value}'})
-                        wrote = True
-        except:
-            logs.error('接口返回值提取异常，请检查yaml文件extract_list表达式是否正确！')
+            extracted = compile_extract(extract, extract_list).apply(response)
+            if extracted:
+                self.yml_parser.write_yaml_data(extracted)
+        except Exception:
+            logs.error('接口返回值提取异常，请检查yaml文件extract/extract_list表达式是否正确！%s' % traceback.format_exc())
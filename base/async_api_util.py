@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import datetime
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlencode
+
+import aiohttp
+import allure
+
+from base.api_util import RequestBase
+from common.log_util import log_body, logs
+from common.metrics_util import RequestTiming, api_metrics, body_size
+from common.parser_yaml import get_testcase_yaml
+from common.requests_util import SendRequest
+from common.response_util import ResponseWrapper
+from conf import setting
+
+
+class AsyncResponse:
+    """异步请求的响应，常用属性与 requests.Response 保持一致，供 verify_response 和 Allure 附件复用"""
+
+    def __init__(self, url, status_code, headers, content, encoding, elapsed, cookies):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+        self.elapsed = elapsed
+        self.cookies = cookies
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def _form_value(value):
+    """aiohttp 只接受 str/int/float 的参数值，其余按 requests 的方式转成字符串"""
+    if isinstance(value, (str, int, float)) and not isinstance(value, bool):
+        return value
+    return str(value)
+
+
+def _normalize_fields(fields):
+    if not isinstance(fields, dict):
+        return fields
+    # 与 requests 一致，值为 None 的字段不发送
+    return {key: _form_value(value) for key, value in fields.items() if value is not None}
+
+
+class AsyncRequestBase(RequestBase):
+    """
+    基于 asyncio + aiohttp 的用例执行引擎：
+    - 适用于互相之间没有 extract 依赖的独立用例，按信号量控制最大并发
+    - 用例解析、extract 提取、断言与 RequestBase 共用同一套逻辑
+    - 每条用例的 Allure 附件写在以用例名称命名的 step 中
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        retries: int = 2,
+        backoff_factor: float = 0.3,
+        status_forcelist: tuple = (429, 500, 502, 503, 504),
+    ):
+        super().__init__()
+        self.concurrency = concurrency or self.conf.get_async_concurrency()
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = status_forcelist
+
+    async def send_request(
+        self,
+        session: aiohttp.ClientSession,
+        *,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, Any]] = None,
+        cookies: Optional[Dict[str, Any]] = None,
+        files: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None,
+        verify: bool = False,
+        **kwargs: Any,
+    ) -> ResponseWrapper:
+        """
+        异步发送请求，重试策略与 SendRequest 一致（连接异常和 status_forcelist 中的状态码）
+        :return: 包装了 AsyncResponse 的 ResponseWrapper
+        """
+        timeout = timeout or getattr(setting, "API_TIMEOUT", 30)
+        params = _normalize_fields(kwargs.pop('params', None))
+        data = _normalize_fields(kwargs.pop('data', None))
+        json_body = kwargs.pop('json', None)
+        if files:
+            form = aiohttp.FormData()
+            for key, value in (data or {}).items():
+                form.add_field(key, str(value))
+            for field, fileobj in files.items():
+                form.add_field(field, fileobj, filename=os.path.basename(getattr(fileobj, 'name', field)))
+            data = form
+
+        logs.info("请求方式：%s", method)
+        logs.info("请求地址：%s", url)
+        logs.info("请求头：%s", headers)
+        logs.info("Cookie：%s", cookies)
+
+        # 文件表单只能发送一次，上传接口不重试
+        retries = 0 if files else self.retries
+        for attempt in range(retries + 1):
+            start_ts = time.perf_counter()
+            try:
+                async with session.request(
+                    method=str(method).upper(),
+                    url=url,
+                    headers=headers,
+                    cookies=cookies,
+                    params=params,
+                    data=data,
+                    json=json_body,
+                    ssl=None if verify else False,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                    **kwargs,
+                ) as resp:
+                    ttfb = time.perf_counter() - start_ts
+                    content = await resp.read()
+                    response = ResponseWrapper(AsyncResponse(
+                        url=str(resp.url),
+                        status_code=resp.status,
+                        headers={str(k): str(v) for k, v in resp.headers.items()},
+                        content=content,
+                        encoding=resp.get_encoding() if content else None,
+                        elapsed=datetime.timedelta(seconds=time.perf_counter() - start_ts),
+                        cookies={name: morsel.value for name, morsel in resp.cookies.items()},
+                    ))
+                    response.timing = RequestTiming(
+                        total=time.perf_counter() - start_ts, ttfb=ttfb, bytes_in=len(content),
+                        bytes_out=self._body_size(data, json_body),
+                        retries=attempt)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt < retries:
+                    await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+                    continue
+                logs.error("ConnectionError--连接异常：%s", e)
+                raise
+            if response.status_code in self.status_forcelist and attempt < retries:
+                await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+                continue
+            break
+
+        if response.cookies:
+            cookie_block = {"Cookie": response.cookies}
+            self.yml_parser.write_yaml_data(cookie_block)
+            logs.info("响应Set-Cookie写入extract.yaml：%s", cookie_block)
+        logs.info("响应码：%s", response.status_code)
+        logs.info("响应耗时：%ss", round(response.elapsed.total_seconds(), 3))
+        logs.info("响应文本：%s", log_body(lambda: response.text))
+        return response
+
+    @staticmethod
+    def _body_size(data, json_body):
+        """估算请求体字节数：表单按urlencode计算，json按序列化结果计算，文件表单记为0"""
+        if json_body is not None:
+            return body_size(json.dumps(json_body))
+        if isinstance(data, dict):
+            return body_size(urlencode(data, doseq=True))
+        return body_size(data)
+
+    async def run_case(self, session, semaphore, base_info, test_case):
+        """执行单条用例：解析 -> 并发受限地发送请求 -> 同步处理响应"""
+        case = self.prepare_case(base_info, test_case)
+        try:
+            async with semaphore:
+                logs.info("接口名称：%s", case['api_name'])
+                logs.info("测试用例名称：%s", case['case_name'])
+                res = await self.send_request(session, method=case['method'], url=case['url'],
+                                              headers=case['header'], cookies=case['cookies'],
+                                              files=case['files'], **case['request'])
+        finally:
+            SendRequest._close_files(case['files'])
+        api_metrics.record(case['api_name'], res.timing, url=case['url'])
+
+        # 以下均为同步代码，不会与其他协程交错执行，附件归属到当前用例的 step
+        with allure.step(case['case_name']):
+            self.attach_case(case)
+            SendRequest._attach_params_to_allure(case['request'])
+            SendRequest._attach_request_to_allure(case['method'], case['url'], case['header'], case['cookies'],
+                                                  case['files'], case['request'])
+            SendRequest._attach_response_to_allure(res)
+            self.verify_response(case, res)
+
+    async def _run_all(self, cases, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        # 不在会话中保存 Cookie，与同步执行保持一致
+        async with aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar()) as session:
+            return await asyncio.gather(
+                *(self.run_case(session, semaphore, base_info, test_case) for base_info, test_case in cases),
+                return_exceptions=True,
+            )
+
+    def run_cases(self, cases: List[list], concurrency: Optional[int] = None) -> None:
+        """
+        并发执行多条独立用例，任一用例失败则在全部执行完后抛出 AssertionError
+        :param cases: get_testcase_yaml 返回的 [base_info, test_case] 列表
+        :param concurrency: 最大并发数，默认取 config.ini 的 [ASYNC] concurrency
+        :return:
+        """
+        concurrency = concurrency or self.concurrency
+        results = asyncio.run(self._run_all(cases, concurrency))
+        failed = []
+        for (_, test_case), result in zip(cases, results):
+            if isinstance(result, BaseException):
+                failed.append(f"{test_case.get('case_name')}：{result!r}")
+        logs.info("异步执行用例%s条，失败%s条，并发数%s", len(cases), len(failed), concurrency)
+        if failed:
+            logs.error("异步执行失败用例：%s", failed)
+            raise AssertionError("异步执行失败用例：\n" + "\n".join(failed))
+
+    def run_testcase_yaml(self, *files: str, concurrency: Optional[int] = None) -> None:
+        """读取单接口 yaml 文件（baseInfo + 多条 testCase 格式）并发执行其中全部用例"""
+        cases = []
+        for file in files:
+            cases.extend(get_testcase_yaml(file) or [])
+        self.run_cases(cases, concurrency=concurrency)
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+import itertools
+import math
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from base.api_util import RequestBase
+from base.api_util_list import RequestBase as RequestBaseList
+from common.log_util import logs
+from common.parser_yaml import get_testcase_yaml
+from common.requests_util import session_pool
+from common.two_dimension_data import print_table
+
+
+def percentile(sorted_values, percent):
+    """最近秩法求百分位数，sorted_values需已升序排列"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LoadUnit:
+    """
+    一次迭代执行的内容：
+    - case：单接口yaml中的一条用例，由api_util.RequestBase执行
+    - flow：业务流yaml（如BusinessScenario.yml）中的全部接口，按顺序由api_util_list.RequestBase执行
+    """
+
+    def __init__(self, kind, label, data):
+        self.kind = kind
+        self.label = label
+        self.data = data
+
+
+def load_units(files, keyword=None):
+    """
+    读取yaml用例文件，生成压测单元
+    :param files: yaml文件列表，业务流文件整体作为一个单元，单接口文件每条用例作为一个单元
+    :param keyword: 只保留接口名称或用例名称包含该关键字的单接口用例
+    """
+    units = []
+    for file in files:
+        cases = get_testcase_yaml(file) or []
+        if cases and isinstance(cases[0], dict):
+            units.append(LoadUnit('flow', os.path.splitext(os.path.basename(file))[0], cases))
+            continue
+        for base_info, test_case in cases:
+            label = f"{base_info.get('api_name')}/{test_case.get('case_name')}"
+            if keyword and keyword not in label:
+                continue
+            units.append(LoadUnit('case', label, (base_info, test_case)))
+    return units
+
+
+class LoadStats:
+    """按压测单元汇总迭代次数、失败次数和耗时，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.failures = {}
+        self.errors = {}
+        self.dropped = 0
+        self.started = None
+        self.finished = None
+
+    def record(self, label, elapsed, error=None):
+        with self._lock:
+            self.latencies.setdefault(label, []).append(elapsed)
+            if error is not None:
+                self.failures[label] = self.failures.get(label, 0) + 1
+                self.errors.setdefault(label, error)
+
+    def drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    @property
+    def wall_time(self):
+        return max((self.finished or time.perf_counter()) - (self.started or 0), 1e-9)
+
+    def _row(self, label, values, failures):
+        values = sorted(values)
+        count = len(values)
+        return [label, count, failures, f'{failures / max(count, 1):.1%}', round(count / self.wall_time, 2),
+                round(sum(values) / max(count, 1) * 1000, 1),
+                *(round(percentile(values, p) * 1000, 1) for p in (50, 90, 99)),
+                round((values[-1] if values else 0) * 1000, 1)]
+
+    def table(self):
+        """汇总表格，格式同print_table的入参，耗时单位为毫秒"""
+        blank = [''] * 10
+        rows = [['压测单元', '迭代数', '失败数', '失败率', '吞吐(次/s)', '平均(ms)', 'p50(ms)', 'p90(ms)', 'p99(ms)', '最大(ms)'],
+                blank]
+        for label, values in self.latencies.items():
+            rows.append(self._row(label, values, self.failures.get(label, 0)))
+        rows.append(blank)
+        rows.append(self._row('合计', list(itertools.chain(*self.latencies.values())), sum(self.failures.values())))
+        rows.append(blank)
+        return rows
+
+
+class LoadRunner:
+    """
+    复用yaml用例的压测执行器：
+    - rate>0为开放模型：按目标速率（爬坡期内线性增长）发起迭代，不等待前一次迭代完成；
+      所有虚拟用户都在执行时，本次迭代计为丢弃（dropped），不排队，避免耗时被排队时间掩盖
+    - rate=0为封闭模型：vus个虚拟用户各自循环执行，在爬坡期内依次启动
+    - 每个虚拟用户线程使用独立的RequestBase，请求、extract提取、断言与pytest执行完全一致
+    extract关联数据在进程内共享，并发迭代之间同名参数以最后写入为准
+    """
+
+    def __init__(self, units, vus=10, rate=0.0, ramp_up=0.0, duration=60.0):
+        if not units:
+            raise ValueError('没有可执行的压测用例，请检查yaml文件和筛选条件')
+        self.units = units
+        self.vus = max(1, int(vus))
+        self.rate = max(0.0, float(rate))
+        self.ramp_up = max(0.0, float(ramp_up))
+        self.duration = float(duration)
+        self.stats = LoadStats()
+        self._local = threading.local()
+        self._cycle = itertools.cycle(units)
+        self._cycle_lock = threading.Lock()
+
+    def _next_unit(self):
+        with self._cycle_lock:
+            return next(self._cycle)
+
+    def _request_base(self, kind):
+        key = f'{kind}_base'
+        base = getattr(self._local, key, None)
+        if base is None:
+            base = RequestBase() if kind == 'case' else RequestBaseList()
+            setattr(self._local, key, base)
+        return base
+
+    def _iterate(self, unit):
+        """执行一次迭代并记录耗时，失败不抛出"""
+        error = None
+        start = time.perf_counter()
+        try:
+            if unit.kind == 'case':
+                self._request_base('case').specification_yaml(*unit.data)
+            else:
+                for block in unit.data:
+                    self._request_base('flow').specification_yaml(block)
+        except (Exception, pytest.fail.Exception) as e:
+            error = f'{type(e).__name__}: {e}'
+            logs.debug('压测迭代失败：%s', traceback.format_exc())
+        self.stats.record(unit.label, time.perf_counter() - start, error)
+
+    def arrival_offset(self, n):
+        """开放模型中第n次迭代（从0开始）相对开始时间的发起时刻，爬坡期内速率从0线性增长到rate"""
+        ramp_iterations = self.rate * self.ramp_up / 2
+        if n < ramp_iterations:
+            return math.sqrt(2 * self.ramp_up * n / self.rate)
+        return self.ramp_up / 2 + n / self.rate
+
+    def _run_open(self, deadline):
+        slots = threading.BoundedSemaphore(self.vus)
+
+        def iterate(unit):
+            try:
+                self._iterate(unit)
+            finally:
+                slots.release()
+
+        with ThreadPoolExecutor(max_workers=self.vus, thread_name_prefix='load-vu') as executor:
+            for n in itertools.count():
+                scheduled = self.stats.started + self.arrival_offset(n)
+                if scheduled >= deadline:
+                    break
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                if slots.acquire(blocking=False):
+                    executor.submit(iterate, self._next_unit())
+                else:
+                    self.stats.drop()
+
+    def _run_closed(self, deadline):
+        def virtual_user(index):
+            time.sleep(self.ramp_up * index / self.vus)
+            while time.perf_counter() < deadline:
+                self._iterate(self._next_unit())
+
+        threads = [threading.Thread(target=virtual_user, args=(i,), name=f'load-vu-{i}', daemon=True)
+                   for i in range(self.vus)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def run(self):
+        """执行压测，返回LoadStats"""
+        # 连接池至少容纳全部虚拟用户的并发连接，避免超出部分的连接用完即关
+        session_pool.ensure_pool_maxsize(self.vus)
+        logs.warning('开始压测：单元%s个，虚拟用户%s，速率%s，爬坡%ss，持续%ss',
+                     len(self.units), self.vus, self.rate or '不限', self.ramp_up, self.duration)
+        self.stats.started = time.perf_counter()
+        deadline = self.stats.started + self.duration
+        if self.rate > 0:
+            self._run_open(deadline)
+        else:
+            self._run_closed(deadline)
+        self.stats.finished = time.perf_counter()
+        return self.stats
+
+    def print_summary(self):
+        print_table(self.stats.table())
+        if self.rate > 0:
+            print(f'目标速率：{self.rate}次/s，因虚拟用户不足丢弃的迭代：{self.stats.dropped}')
+        for label, error in self.stats.errors.items():
+            print(f'[{label}] 首个失败原因：{error}')
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+import glob
+import os
+import re
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import yaml
+
+from common.log_util import logs
+from common.parser_yaml import get_testcase_yaml
+from conf.setting import DIR_BASE
+
+# yaml用例中读取关联参数的占位符，如：${get_extract_data(goodsId,0)}
+_CONSUME_PATTERN = re.compile(r'get_extract_data\((\w+)')
+# 测试模块中参数化引用的yaml文件，如：get_testcase_yaml('./testcase/UserManager/addUser.yaml')
+_TESTCASE_FILE_PATTERN = re.compile(r'get_testcase_yaml\(\s*[\'"]([^\'"]+)[\'"]')
+
+
+def discover_testcase_files(testcase_dir=None):
+    """按测试模块中的声明顺序（即用例的执行顺序）收集被参数化引用的yaml文件"""
+    testcase_dir = testcase_dir or os.path.join(DIR_BASE, 'testcase')
+    files = []
+    for module in sorted(glob.glob(os.path.join(testcase_dir, '**', 'test_*.py'), recursive=True)):
+        with open(module, 'r', encoding='utf-8') as f:
+            for path in _TESTCASE_FILE_PATTERN.findall(f.read()):
+                path = os.path.abspath(os.path.join(DIR_BASE, path))
+                if path not in files:
+                    files.append(path)
+    return files
+
+
+class CaseNode:
+    """调度节点：一个yaml用例文件，文件内的用例按顺序串行执行"""
+
+    def __init__(self, file, index):
+        self.file = file
+        self.index = index
+        self.produces = set()
+        self.consumes = set()
+        self.predecessors = set()
+        self.successors = set()
+
+    def __repr__(self):
+        return f"CaseNode({os.path.relpath(self.file, DIR_BASE)})"
+
+
+class CaseScheduler:
+    """
+    基于extract关联参数的依赖调度：
+    - 静态扫描yaml用例文件，extract/extract_list的key为生产，get_extract_data(key)为消费
+    - 按文件顺序（默认为测试模块中的声明顺序）建立依赖：先写后读、先读后写、先写后写同一个key的文件之间串行，其余文件可并行
+    - 未被任何扫描文件生产的key（如登录夹具写入的token）视为外部已就绪的数据
+    """
+
+    def __init__(self, files=None):
+        if files is None:
+            files = discover_testcase_files()
+        self.nodes = [CaseNode(os.path.abspath(file), index) for index, file in enumerate(files)]
+        self._scanned = False
+
+    @staticmethod
+    def _walk(data, node):
+        if isinstance(data, dict):
+            for key, value in data.items():
+                if key in ('extract', 'extract_list') and isinstance(value, dict):
+                    node.produces.update(str(k) for k in value.keys())
+                else:
+                    CaseScheduler._walk(value, node)
+        elif isinstance(data, list):
+            for item in data:
+                CaseScheduler._walk(item, node)
+        elif isinstance(data, str):
+            node.consumes.update(_CONSUME_PATTERN.findall(data))
+
+    def scan(self):
+        """扫描全部用例文件，建立生产/消费关系并连边"""
+        for node in self.nodes:
+            try:
+                with open(node.file, 'r', encoding='utf-8') as f:
+                    self._walk(yaml.safe_load(f), node)
+            except Exception:
+                logs.error(f'扫描用例文件【{node.file}】失败：{traceback.format_exc()}')
+
+        for before_index, before in enumerate(self.nodes):
+            for after in self.nodes[before_index + 1:]:
+                if (before.produces & (after.consumes | after.produces)) or (before.consumes & after.produces):
+                    before.successors.add(after)
+                    after.predecessors.add(before)
+        self._scanned = True
+        return self
+
+    def groups(self):
+        """
+        按依赖关系划分的连通分组，分组之间互不依赖，可分配到不同的进程/线程
+        :return: 文件路径列表的列表，组内按扫描顺序排列
+        """
+        if not self._scanned:
+            self.scan()
+        parent = {node.file: node.file for node in self.nodes}
+
+        def find(file):
+            while parent[file] != file:
+                parent[file] = parent[parent[file]]
+                file = parent[file]
+            return file
+
+        for node in self.nodes:
+            for successor in node.successors:
+                parent[find(successor.file)] = find(node.file)
+
+        grouped = {}
+        for node in self.nodes:
+            grouped.setdefault(find(node.file), []).append(node.file)
+        return list(grouped.values())
+
+    def group_of(self):
+        """返回 {文件路径: 分组名}，分组名取组内第一个文件的相对路径"""
+        mapping = {}
+        for files in self.groups():
+            name = os.path.relpath(files[0], DIR_BASE).replace(os.sep, '/')
+            for file in files:
+                mapping[file] = name
+        return mapping
+
+    @staticmethod
+    def run_file(file):
+        """按顺序执行单个yaml文件中的全部用例，返回失败信息列表"""
+        from base import api_util, api_util_list
+
+        errors = []
+        for case in get_testcase_yaml(file) or []:
+            try:
+                if isinstance(case, dict):
+                    api_util_list.RequestBase().specification_yaml(case)
+                else:
+                    api_util.RequestBase().specification_yaml(case[0], case[1])
+            except BaseException as e:
+                name = case['baseInfo'].get('api_name') if isinstance(case, dict) else case[1].get('case_name')
+                errors.append(f'{os.path.basename(file)}::{name}：{e!r}')
+        return errors
+
+    def run(self, max_workers=4):
+        """
+        多线程执行：前驱文件全部执行完后才提交后继文件，互不依赖的文件并行执行
+        :param max_workers: 最大线程数
+        :return: 失败信息列表
+        """
+        if not self._scanned:
+            self.scan()
+        remaining = {node: len(node.predecessors) for node in self.nodes}
+        errors = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            running = {}
+            for node in [n for n, count in remaining.items() if count == 0]:
+                running[executor.submit(self.run_file, node.file)] = node
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node = running.pop(future)
+                    errors.extend(future.result())
+                    for successor in node.successors:
+                        remaining[successor] -= 1
+                        if remaining[successor] == 0:
+                            running[executor.submit(self.run_file, successor.file)] = successor
+        logs.info('依赖调度执行完成，用例文件%s个，失败%s条', len(self.nodes), len(errors))
+        return errors
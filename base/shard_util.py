@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+import argparse
+import glob
+import json
+import os
+import shutil
+import statistics
+import sys
+import xml.etree.ElementTree as ET
+
+from base.remove_file import remove_file
+from common.email_util import send_summary_email
+from common.history_util import canonical_nodeid
+from common.log_util import logs
+from common.metrics_util import MetricsCollector
+from conf.setting import DIR_BASE, FILE_PATH
+
+# junit结果中需要跨分片累加的testsuite属性
+_SUITE_COUNTERS = ('tests', 'errors', 'failures', 'skipped')
+# 分片清单文件名，与--junitxml指定的results.xml放在同一目录
+MANIFEST_NAME = 'shard_manifest.json'
+
+
+def load_durations(path=None):
+    """
+    读取用例历史耗时 {nodeid: 秒}，JSON文件由 python -m common.history_util export 导出
+    各节点必须使用同一份耗时数据才能得到相同的分配结果，因此不读取本机的运行历史库：
+    未指定path时返回空字典，每条用例按相同耗时均分
+    """
+    if not path:
+        logs.warning('未指定--shard-durations，分片按用例数均分')
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return {canonical_nodeid(nodeid): float(seconds) for nodeid, seconds in json.load(f).items()}
+
+
+def partition(group_weights, num_shards):
+    """
+    最长处理时间优先（LPT）分配：分组按耗时从大到小依次放入当前总耗时最小的分片
+    分组名参与排序，相同输入在每个CI节点上得到相同的分配结果
+    :param group_weights: {分组名: 预估耗时}
+    :return: {分组名: 分片序号}
+    """
+    loads = [0.0] * num_shards
+    assignment = {}
+    for group, weight in sorted(group_weights.items(), key=lambda item: (-item[1], item[0])):
+        index = min(range(num_shards), key=lambda i: (loads[i], i))
+        assignment[group] = index
+        loads[index] += weight
+    return assignment
+
+
+def split_items(items, groups, durations, shard_id, num_shards):
+    """
+    按耗时均衡切分本分片执行的用例，同一分组（extract依赖链、业务流文件）的用例始终在同一分片
+    没有历史耗时的用例按已知耗时的中位数估算，完全没有历史时每条用例按1秒估算
+    :param items: pytest收集到的用例
+    :param groups: 与items一一对应的分组名
+    :return: (本分片执行的用例, 取消选择的用例)，均保持收集顺序
+    """
+    known = [durations[canonical_nodeid(item.nodeid)] for item in items
+             if canonical_nodeid(item.nodeid) in durations]
+    default = statistics.median(known) if known else 1.0
+    group_weights = {}
+    for item, group in zip(items, groups):
+        weight = durations.get(canonical_nodeid(item.nodeid), default)
+        group_weights[group] = group_weights.get(group, 0.0) + weight
+    assignment = partition(group_weights, num_shards)
+    selected, deselected = [], []
+    for item, group in zip(items, groups):
+        (selected if assignment[group] == shard_id else deselected).append(item)
+    shard_weight = sum(weight for group, weight in group_weights.items() if assignment[group] == shard_id)
+    logs.info('分片%s/%s：执行%s条用例，预估耗时%.1f秒（全部用例%.1f秒，有历史耗时%s条）',
+              shard_id, num_shards, len(selected), shard_weight, sum(group_weights.values()), len(known))
+    return selected, deselected
+
+
+def write_manifest(path, shard_id, num_shards, items, selected):
+    """
+    写出分片清单：分片序号、全部收集到的用例和本分片执行的用例，merge时据此校验各分片的结果不重不漏
+    xdist的各worker收集结果相同，先写临时文件再替换，多个worker同时写入也不会损坏文件
+    """
+    manifest = {'shard_id': shard_id, 'num_shards': num_shards,
+                'collected': [canonical_nodeid(item.nodeid) for item in items],
+                'selected': [canonical_nodeid(item.nodeid) for item in selected]}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_file = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, path)
+
+
+def _junit_id(nodeid):
+    """nodeid转为junit结果中的 classname::name，规则同pytest junitxml的mangle_test_address"""
+    path, _, rest = nodeid.partition('::')
+    names = rest.split('::') if rest else []
+    path = path.replace('\\', '/')
+    if path.endswith('.py'):
+        path = path[:-3]
+    names = path.split('/') + names
+    return f"{'.'.join(names[:-1])}::{names[-1]}"
+
+
+def _case_id(case):
+    """junit结果中testcase的 classname::name，去掉pytest-xdist按xdist_group分组时追加的@分组名"""
+    return canonical_nodeid(f"{case.get('classname')}::{case.get('name')}")
+
+
+def check_coverage(shard_dirs, suite):
+    """
+    校验各分片的结果：分片清单齐全且一致，每条收集到的用例在合并结果中有且只有一条记录
+    分片内使用 -n --dist loadgroup 时junit用例名带有@分组名，按去掉分组名后的用例名比较
+    :return: 问题描述列表，为空表示校验通过
+    """
+    manifests = []
+    for shard_dir in shard_dirs:
+        path = os.path.join(shard_dir, MANIFEST_NAME)
+        if not os.path.exists(path):
+            return [f'分片目录中没有分片清单: {path}']
+        with open(path, 'r', encoding='utf-8') as f:
+            manifests.append(json.load(f))
+    problems = []
+    num_shards = {manifest['num_shards'] for manifest in manifests}
+    shard_ids = sorted(manifest['shard_id'] for manifest in manifests)
+    if len(num_shards) != 1 or shard_ids != list(range(next(iter(num_shards)))):
+        problems.append(f'分片不完整或重复：分片总数{sorted(num_shards)}，已合并分片{shard_ids}')
+    collected = set(manifests[0]['collected'])
+    if any(set(manifest['collected']) != collected for manifest in manifests[1:]):
+        problems.append('各分片收集到的用例不一致，请确认各节点的代码和用例文件版本相同')
+
+    expected = {}
+    for manifest in manifests:
+        for nodeid in manifest['selected']:
+            expected[_junit_id(nodeid)] = expected.get(_junit_id(nodeid), 0) + 1
+    for nodeid in collected:
+        expected.setdefault(_junit_id(nodeid), 0)
+    actual = {}
+    for case in (suite.iter('testcase') if suite is not None else ()):
+        junit_id = _case_id(case)
+        actual[junit_id] = actual.get(junit_id, 0) + 1
+    duplicated = sorted(junit_id for junit_id in set(expected) | set(actual)
+                        if max(expected.get(junit_id, 0), actual.get(junit_id, 0)) > 1)
+    missing = sorted(junit_id for junit_id, count in expected.items() if not actual.get(junit_id))
+    unexpected = sorted(junit_id for junit_id in actual if junit_id not in expected)
+    for title, nodes in (('重复执行的用例', duplicated), ('未执行的用例', missing), ('不在收集范围内的用例', unexpected)):
+        if nodes:
+            problems.append(f"{title}{len(nodes)}条：{'、'.join(nodes[:20])}{' 等' if len(nodes) > 20 else ''}")
+    return problems
+
+
+def _merge_allure(shard_dirs, allure_dir):
+    """把各分片的allure结果文件复制到同一目录，文件名均为uuid或内容hash，不会互相覆盖"""
+    remove_file(allure_dir, ['json', 'txt', 'attach', 'gz', 'properties'])
+    copied = 0
+    for shard_dir in shard_dirs:
+        source = os.path.join(shard_dir, 'temp')
+        if not os.path.isdir(source):
+            logs.warning('分片目录中没有allure结果: %s', source)
+            continue
+        for file in os.listdir(source):
+            path = os.path.join(source, file)
+            if os.path.isfile(path):
+                shutil.copy(path, allure_dir)
+                copied += 1
+    environment = os.path.join(DIR_BASE, 'environment.xml')
+    if copied and os.path.exists(environment):
+        shutil.copy(environment, allure_dir)
+    return copied
+
+
+def _merge_junit(shard_dirs, output):
+    """
+    合并各分片的results.xml为一个testsuite：用例数、失败数等累加，耗时取各分片的最大值（即并行执行的墙钟时间）
+    :return: (合并后的testsuite, 各分片耗时列表)
+    """
+    merged = None
+    shard_times = []
+    for shard_dir in shard_dirs:
+        path = os.path.join(shard_dir, 'results.xml')
+        if not os.path.exists(path):
+            logs.warning('分片目录中没有results.xml: %s', path)
+            continue
+        root = ET.parse(path).getroot()
+        suites = [root] if root.tag == 'testsuite' else root.findall('testsuite')
+        for suite in suites:
+            shard_times.append(float(suite.get('time', 0)))
+            if merged is None:
+                merged = ET.Element('testsuite', dict(suite.attrib))
+                for key in _SUITE_COUNTERS:
+                    merged.set(key, '0')
+            for key in _SUITE_COUNTERS:
+                merged.set(key, str(int(merged.get(key)) + int(suite.get(key, 0))))
+            merged.extend(suite)
+    if merged is None:
+        return None, shard_times
+    merged.set('time', f'{max(shard_times):.3f}')
+    testsuites = ET.Element('testsuites')
+    testsuites.append(merged)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    ET.ElementTree(testsuites).write(output, encoding='utf-8', xml_declaration=True)
+    return merged, shard_times
+
+
+def _merge_metrics(shard_dirs, output):
+    collector = MetricsCollector()
+    for path in (os.path.join(shard_dir, 'api_metrics.json') for shard_dir in shard_dirs):
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                collector.merge(json.load(f))
+    if collector.apis:
+        collector.dump(output)
+    return collector
+
+
+def build_summary(suite, shard_times, metrics, problems=()):
+    """按conftest中generate_test_summary的格式生成合并后的测试结果摘要，分片校验问题列在最前"""
+    if suite is None:
+        return '没有可合并的分片测试结果'
+    warnings = ["分片结果校验失败，以下问题导致结果不完整：", *(f"- {problem}" for problem in problems), ""] \
+        if problems else []
+    total = int(suite.get('tests', 0))
+    failures, errors, skipped = int(suite.get('failures', 0)), int(suite.get('errors', 0)), int(suite.get('skipped', 0))
+    lines = warnings + [
+        "自动化测试结果 (请着重关注测试失败的接口)：",
+        f"测试用例总数：{total}",
+        f"测试通过数：{total - failures - errors - skipped}",
+        f"测试失败数：{failures}",
+        f"错误数量：{errors}",
+        f"跳过执行数量：{skipped}",
+        f"执行总时长：{max(shard_times):.2f}(秒)",
+        f"分片数：{len(shard_times)}，各分片耗时：{'、'.join(f'{t:.2f}' for t in shard_times)}(秒)",
+    ]
+    metrics_lines = metrics.summary_lines()
+    if metrics_lines:
+        lines.append("接口耗时（按p90从高到低）：")
+        lines.extend(metrics_lines)
+    lines.append("")
+    for title, tag in (("失败用例", 'failure'), ("错误用例", 'error'), ("跳过用例", 'skipped')):
+        nodes = [_case_id(case) for case in suite.iter('testcase')
+                 if case.find(tag) is not None]
+        if nodes:
+            lines.append(f"{title}:")
+            lines.extend(f"- {node}" for node in nodes)
+            lines.append("")
+    return "\n".join(lines).strip()
+
+
+def merge(shard_dirs, allure_dir=None, junit_output=None, metrics_output=None):
+    """
+    合并各分片的输出并发送一封汇总邮件，每个分片目录包含：
+    - temp/：--alluredir 指定的allure结果
+    - results.xml：--junitxml 指定的junit结果
+    - api_metrics.json、shard_manifest.json：与results.xml同目录自动写出的接口耗时统计和分片清单
+    :return: (合并后的测试结果摘要, 失败和错误的用例数, 分片校验问题列表)
+    """
+    allure_dir = allure_dir or FILE_PATH['TEMP']
+    copied = _merge_allure(shard_dirs, allure_dir)
+    suite, shard_times = _merge_junit(shard_dirs, junit_output or os.path.join(FILE_PATH['RESULTXML'], 'results.xml'))
+    metrics = _merge_metrics(shard_dirs, metrics_output or FILE_PATH['API_METRICS'])
+    problems = check_coverage(shard_dirs, suite)
+    for problem in problems:
+        logs.error('分片结果校验失败：%s', problem)
+    logs.info('已合并%s个分片：allure结果文件%s个', len(shard_dirs), copied)
+    summary = build_summary(suite, shard_times, metrics, problems)
+    print(summary)
+    send_summary_email(summary, allure_dir)
+    failed = int(suite.get('failures', 0)) + int(suite.get('errors', 0)) if suite is not None else 0
+    return summary, failed, problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='合并分片运行（--shard-id/--num-shards）的allure结果、results.xml和接口耗时统计')
+    sub = parser.add_subparsers(dest='command', required=True)
+    merge_parser = sub.add_parser('merge', help='合并分片输出并发送一封汇总邮件')
+    merge_parser.add_argument('shard_dirs', nargs='+', help='分片输出目录，支持通配符，如 report/shards/*')
+    merge_parser.add_argument('--alluredir', help='合并后的allure结果目录，默认为FILE_PATH["TEMP"]')
+    merge_parser.add_argument('--junitxml', help='合并后的junit结果，默认为report/results.xml')
+    args = parser.parse_args(argv)
+
+    shard_dirs = sorted({path for pattern in args.shard_dirs for path in (glob.glob(pattern) or [pattern])})
+    _, failed, problems = merge(shard_dirs, args.alluredir, args.junitxml)
+    if problems:
+        return 2
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
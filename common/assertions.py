@@ -1,10 +1,65 @@
 import traceback
 import allure
-import jsonpath
 import operator
 
+from common.attach_util import attach
 from common.log_util import logs
-from common.connection import ConnectMysql
+from common.response_util import ResponseIndex
+from conf.config_util import OperationConfig
+
+
+class DbAssertBatch:
+    """
+    批量数据库断言：收集db断言，flush时合并为一次查询执行，并把每条断言的结果对应回所属用例
+    """
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, case_name, expected_results):
+        sql, args = expected_results, None
+        if isinstance(expected_results, dict):
+            sql, args = expected_results.get('sql'), expected_results.get('args')
+        self.items.append((case_name, sql, args))
+
+    def flush(self):
+        """
+        执行已收集的全部db断言并清空
+        :return: 失败的断言列表 [(用例名称, SQL)]
+        """
+        items, self.items = self.items, []
+        if not items:
+            return []
+        from common.connection import ConnectMysql
+
+        errors = {}
+        try:
+            results = ConnectMysql().exists_many([(sql, args) for _, sql, args in items])
+        except Exception as e:
+            # 合并查询中任一语句出错都会导致整批失败，逐条重新执行，使每条断言得到各自的结果和异常信息
+            logs.warning(f'批量数据库断言执行异常，改为逐条执行：{e}')
+            results = []
+            for index, (_, sql, args) in enumerate(items):
+                try:
+                    results.append(ConnectMysql().exists(sql, args))
+                except Exception as item_error:
+                    errors[index] = item_error
+                    results.append(False)
+        failed = []
+        for index, ((case_name, sql, _), result) in enumerate(zip(items, results)):
+            if result:
+                logs.info(f"数据库断言成功：【{case_name}】{sql}")
+            elif index in errors:
+                failed.append((case_name, f'{sql}（执行异常：{errors[index]}）'))
+                logs.error(f"数据库断言失败：【{case_name}】{sql}，执行异常：{errors[index]}")
+            else:
+                failed.append((case_name, sql))
+                logs.error(f"数据库断言失败：【{case_name}】{sql}，请检查数据库是否存在该数据！")
+        logs.info(f'批量数据库断言{len(items)}条，失败{len(failed)}条')
+        if failed:
+            attach('\n'.join(f'【{case_name}】{sql}' for case_name, sql in failed),
+                   '数据库断言：失败', attachment_type=allure.attachment_type.TEXT)
+        return failed
 
 
 class Assertions:
@@ -14,49 +69,31 @@ class Assertions:
     2）响应结果相等断言
     3）响应结果不相等断言
     4）数据库断言
+    5）性能断言：max_latency_ms总耗时、max_ttfb_ms首字节耗时、max_body_bytes响应体字节数不超过预期值
 
     """
 
-    def contains_assert(self, value, response, headers):
+    def __init__(self):
+        # 数据库断言执行方式，见config.ini的[DB_ASSERT]
+        self.db_assert_mode = OperationConfig().get_db_assert_mode()
+
+    def contains_assert(self, value, response, headers, index=None):
         """ 字符串包含断言模式，断言预期结果的字符串是否包含在接口的响应信息中
         :param value: 预期结果，yaml文件的预期结果值
         :param response: 接口实际响应结果
         :param headers: 响应头信息
+        :param index: 响应索引，assert_result为同一响应的全部断言共用一个，未传时按本次响应构建
         :return: 返回结果的状态标识
         """
         flag = 0
-        headers = headers or {}
-
-        def _lookup_header(header_key):
-            # 大小写不敏感地在 headers 里找某个键
-            header_value = None
-            try:
-                if isinstance(headers, dict) and header_key in headers:
-                    header_value = headers[header_key]
-                elif hasattr(headers, 'get'):
-                    header_value = headers.get(header_key)
-                    if header_value is None:
-                        header_value = headers.get(str(header_key).lower())
-                        if header_value is None:
-                            header_value = headers.get(str(header_key).upper())
-            except Exception:
-                header_value = None
-            if header_value is None and isinstance(headers, dict):
-                for h_key, h_value in headers.items():
-                    if str(h_key).lower() == str(header_key).lower():
-                        header_value = h_value
-                        break
-            return header_value
+        if index is None:
+            index = ResponseIndex(response, headers)
 
         for assert_key, assert_value in value.items():
-            resp_list = []
-            if isinstance(response, (dict, list)):
-                # 在整个 JSON 树找同名 key
-                jsonpath_result = jsonpath.jsonpath(response, "$..%s" % assert_key)
-                if jsonpath_result and isinstance(jsonpath_result, list):
-                    resp_list = jsonpath_result
+            # 在整个 JSON 树找同名 key（等价于 $..key），未找到再大小写不敏感地查找响应头
+            resp_list = index.find(assert_key)
             if not resp_list:
-                header_value = _lookup_header(assert_key)
+                header_value = index.header(assert_key)
                 if header_value is not None:
                     resp_list = [header_value]
 
@@ -71,13 +108,13 @@ class Assertions:
                     match = str(expected) in str(target)
                 if not match:
                     flag += 1
-                    allure.attach(f"预期包含：{expected}\n实际：{target}", '包含断言：失败',
-                                  attachment_type=allure.attachment_type.TEXT)
+                    attach(f"预期包含：{expected}\n实际：{target}", '包含断言：失败',
+                           attachment_type=allure.attachment_type.TEXT)
                     logs.error(f"包含断言失败：预期包含【{expected}】，实际【{target}】")
             else:
                 flag += 1
-                allure.attach(f"未找到断言目标键：{assert_key}", '包含断言：失败',
-                              attachment_type=allure.attachment_type.TEXT)
+                attach(f"未找到断言目标键：{assert_key}", '包含断言：失败',
+                       attachment_type=allure.attachment_type.TEXT)
                 logs.error(f"包含断言失败：未找到键【{assert_key}】")
         return flag
 
@@ -97,13 +134,13 @@ class Assertions:
             eq_assert = operator.eq(new_actual_results, expected_results)
             if eq_assert:
                 logs.info(f"相等断言成功：接口实际结果：{new_actual_results}，等于预期结果：" + str(expected_results))
-                allure.attach(f"预期结果：{str(expected_results)}\n实际结果：{new_actual_results}", '相等断言结果：成功',
-                              attachment_type=allure.attachment_type.TEXT)
+                attach(f"预期结果：{str(expected_results)}\n实际结果：{new_actual_results}", '相等断言结果：成功',
+                       attachment_type=allure.attachment_type.TEXT)
             else:
                 flag += 1
                 logs.error(f"相等断言失败：接口实际结果{new_actual_results}，不等于预期结果：" + str(expected_results))
-                allure.attach(f"预期结果：{str(expected_results)}\n实际结果：{new_actual_results}", '相等断言结果：失败',
-                              attachment_type=allure.attachment_type.TEXT)
+                attach(f"预期结果：{str(expected_results)}\n实际结果：{new_actual_results}", '相等断言结果：失败',
+                       attachment_type=allure.attachment_type.TEXT)
         else:
             raise TypeError('相等断言--类型错误，预期结果和接口实际响应结果必须为字典类型！')
         return flag
@@ -124,13 +161,13 @@ class Assertions:
             eq_assert = operator.ne(new_actual_results, expected_results)
             if eq_assert:
                 logs.info(f"不相等断言成功：接口实际结果：{new_actual_results}，不等于预期结果：" + str(expected_results))
-                allure.attach(f"预期结果：{str(expected_results)}\n实际结果：{new_actual_results}", '不相等断言结果：成功',
-                              attachment_type=allure.attachment_type.TEXT)
+                attach(f"预期结果：{str(expected_results)}\n实际结果：{new_actual_results}", '不相等断言结果：成功',
+                       attachment_type=allure.attachment_type.TEXT)
             else:
                 flag += 1
                 logs.error(f"不相等断言失败：接口实际结果{new_actual_results}，等于预期结果：" + str(expected_results))
-                allure.attach(f"预期结果：{str(expected_results)}\n实际结果：{new_actual_results}", '不相等断言结果：失败',
-                              attachment_type=allure.attachment_type.TEXT)
+                attach(f"预期结果：{str(expected_results)}\n实际结果：{new_actual_results}", '不相等断言结果：失败',
+                       attachment_type=allure.attachment_type.TEXT)
         else:
             raise TypeError('不相等断言--类型错误，预期结果和接口实际响应结果必须为字典类型！')
         return flag
@@ -138,28 +175,75 @@ class Assertions:
     def assert_mysql_data(self, expected_results):
         """
         数据库断言
-        :param expected_results: 预期结果，yaml文件的SQL语句
+        :param expected_results: 预期结果，yaml文件的SQL语句；也可写为{sql: SQL语句, args: [参数]}，参数使用%s占位符
         :return: 返回flag标识，0表示正常，非0表示测试不通过
         """
+        # 只有用到数据库断言时才导入数据库连接模块
+        from common.connection import ConnectMysql
+
         flag = 0
-        conn = ConnectMysql()
-        db_value = conn.query_all(expected_results)
-        if db_value is not None:
+        sql, args = expected_results, None
+        if isinstance(expected_results, dict):
+            sql, args = expected_results.get('sql'), expected_results.get('args')
+        # 连接取自会话共享的连接池，只判断是否存在数据，不读取完整结果集
+        try:
+            db_value = ConnectMysql().exists(sql, args)
+        except Exception as e:
+            logs.error(e)
+            db_value = False
+        if db_value:
             logs.info("数据库断言成功")
         else:
             flag += 1
             logs.error("数据库断言失败，请检查数据库是否存在该数据！")
         return flag
 
-    def assert_result(self, expected, response, headers=None):
+    def performance_assert(self, kind, expected_value, timing):
+        """
+        性能断言，数据来自SendRequest.send_request采集的请求耗时和流量
+        :param kind: max_latency_ms、max_ttfb_ms或max_body_bytes
+        :param expected_value: 预期上限，yaml文件的预期结果值
+        :param timing: metrics_util.RequestTiming
+        :return: 返回结果的状态标识
+        """
+        if timing is None:
+            logs.error(f"性能断言失败：未采集到请求耗时数据，无法断言{kind}")
+            attach(f"未采集到请求耗时数据，无法断言{kind}", '性能断言结果：失败',
+                   attachment_type=allure.attachment_type.TEXT)
+            return 1
+        if kind == 'max_latency_ms':
+            label, actual, unit = '总耗时', round(timing.total * 1000, 2), 'ms'
+        elif kind == 'max_ttfb_ms':
+            label, actual, unit = '首字节耗时', round(timing.ttfb * 1000, 2), 'ms'
+        else:
+            label, actual, unit = '响应体大小', timing.bytes_in, '字节'
+        limit = float(expected_value)
+        if actual <= limit:
+            logs.info(f"性能断言成功：{label}{actual}{unit}，不超过{expected_value}{unit}")
+            attach(f"预期{label}不超过：{expected_value}{unit}\n实际{label}：{actual}{unit}", '性能断言结果：成功',
+                   attachment_type=allure.attachment_type.TEXT)
+            return 0
+        logs.error(f"性能断言失败：{label}{actual}{unit}，超过预期{expected_value}{unit}")
+        attach(f"预期{label}不超过：{expected_value}{unit}\n实际{label}：{actual}{unit}", '性能断言结果：失败',
+               attachment_type=allure.attachment_type.TEXT)
+        return 1
+
+    def assert_result(self, expected, response, headers=None, case_name=None, db_batch=None, timing=None):
         """
         断言，通过断言all_flag标记，all_flag==0表示测试通过，否则为失败
         :param expected: 预期结果
         :param response: 实际响应结果
         :param headers: 响应头信息
+        :param case_name: 用例名称，用于把批量db断言的结果对应回用例
+        :param db_batch: 场景级DbAssertBatch，传入时db断言只收集，由调用方在场景结束时flush
+        :param timing: 请求耗时和流量（metrics_util.RequestTiming），用于性能断言
         :return:
         """
         all_flag = 0
+        # case模式下本条用例的db断言在其他断言之后合并为一次查询
+        case_batch = DbAssertBatch() if db_batch is None and self.db_assert_mode != 'immediate' else None
+        # 同一响应的全部断言共用一个索引，响应体只遍历一次
+        index = ResponseIndex(response, headers)
         try:
             logs.info("yaml文件预期结果：%s" % expected)
             # logs.info("实际结果：%s" % response)
@@ -167,7 +251,7 @@ class Assertions:
             for yq in expected:
                 for key, value in yq.items():
                     if key == "contains":
-                        flag = self.contains_assert(value, response, headers=headers)
+                        flag = self.contains_assert(value, response, headers=headers, index=index)
                         all_flag += flag
                     elif key == "eq":
                         flag = self.equal_assert(value, response)
@@ -176,10 +260,18 @@ class Assertions:
                         flag = self.not_equal_assert(value, response)
                         all_flag += flag
                     elif key == 'db':
-                        flag = self.assert_mysql_data(value)
+                        if db_batch is not None or case_batch is not None:
+                            (db_batch or case_batch).add(case_name, value)
+                        else:
+                            flag = self.assert_mysql_data(value)
+                            all_flag += flag
+                    elif key in ('max_latency_ms', 'max_ttfb_ms', 'max_body_bytes'):
+                        flag = self.performance_assert(key, value, timing)
                         all_flag += flag
                     else:
                         logs.error("不支持此种断言方式")
+            if case_batch is not None:
+                all_flag += len(case_batch.flush())
 
         except Exception as exceptions:
             logs.error('接口断言异常，请检查yaml预期结果值是否正确填写!')
@@ -0,0 +1,164 @@
+import atexit
+import gzip
+import hashlib
+import importlib.metadata
+import json
+import queue
+import threading
+
+import allure
+import allure_commons
+from allure_commons.model2 import ATTACHMENT_PATTERN, Attachment
+from allure_commons.types import AttachmentType
+
+from common.log_util import logs
+from conf.config_util import OperationConfig
+
+_STOP = object()
+# 后台写入依赖allure-python-commons的内部接口（AllureReporter._last_executable、_items），
+# 只在验证过的版本范围内启用，范围外回退到同步的allure.attach
+_SUPPORTED_ALLURE_VERSIONS = ((2, 13), (3, 0))
+
+
+def _allure_internals_supported():
+    try:
+        version = importlib.metadata.version('allure-python-commons')
+        current = tuple(int(part) for part in version.split('.')[:2])
+    except (importlib.metadata.PackageNotFoundError, ValueError):
+        return False
+    lower, upper = _SUPPORTED_ALLURE_VERSIONS
+    if not lower <= current < upper:
+        logs.warning(f'allure-python-commons {version} 不在已验证的版本范围内，Allure附件改为同步写入')
+        return False
+    return True
+
+
+def _current_reporter():
+    """返回allure-pytest正在使用的AllureReporter，未启用allure（未指定--alluredir）时返回None"""
+    for plugin in allure_commons.plugin_manager.get_plugins():
+        reporter = getattr(plugin, 'allure_logger', None)
+        if reporter is not None:
+            return reporter
+    return None
+
+
+class AttachmentWriter:
+    """
+    Allure附件的后台写入：
+    - 用例线程只登记附件（名称、类型）并把原始对象放入队列，序列化、压缩和写文件由后台线程完成
+    - 附件文件按内容hash命名，同一进程内相同内容只写一次
+    - 超过gzip_min_bytes的附件压缩为.gz文件，0表示不压缩
+    - 未启用allure时直接丢弃，不做任何序列化
+    - allure-python-commons不在_SUPPORTED_ALLURE_VERSIONS范围内时回退到同步的allure.attach
+    附件对象在flush前不应再修改；allure写入用例结果前需调用flush（见conftest的pytest_runtest_logfinish）
+    """
+
+    def __init__(self, background=None, gzip_min_bytes=None):
+        attach_conf = OperationConfig().get_allure_attach()
+        self.background = attach_conf['background'] if background is None else background
+        self.background = self.background and _allure_internals_supported()
+        self.gzip_min_bytes = attach_conf['gzip_min_bytes'] if gzip_min_bytes is None else gzip_min_bytes
+        self._queue = queue.Queue()
+        self._written = set()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {'attached': 0, 'written': 0, 'deduplicated': 0, 'compressed': 0}
+
+    @staticmethod
+    def serialise(body):
+        """附件内容转为字节：支持无参函数、字节、字符串，其余对象格式化为JSON"""
+        if callable(body):
+            body = body()
+        if isinstance(body, bytes):
+            return body
+        if not isinstance(body, str):
+            body = json.dumps(body, ensure_ascii=False, indent=2, default=str)
+        return body.encode('utf-8')
+
+    def attach(self, body, name=None, attachment_type=None, extension=None):
+        """
+        添加附件，参数与allure.attach一致
+        :param body: 附件内容，可以是字符串、字节、可JSON序列化的对象或返回它们的无参函数
+        """
+        if not self.background:
+            allure.attach(self.serialise(body), name, attachment_type, extension)
+            return
+        reporter = _current_reporter()
+        if reporter is None:
+            return
+        if isinstance(attachment_type, AttachmentType):
+            mime_type, extension = attachment_type.mime_type, attachment_type.extension
+        else:
+            mime_type, extension = attachment_type, extension or 'attach'
+        try:
+            # 附件挂在当前线程正在执行的用例/步骤/fixture上，必须在用例线程登记
+            parent_uuid = reporter._last_executable()
+            parent = reporter._items[parent_uuid] if parent_uuid else None
+        except (AttributeError, KeyError, TypeError):
+            parent = None
+        if parent is None:
+            # 没有执行中的用例或allure版本不兼容，回退到同步写入
+            allure.attach(self.serialise(body), name, attachment_type, extension)
+            return
+        attachment = Attachment(name=name, type=mime_type)
+        parent.attachments.append(attachment)
+        self.stats['attached'] += 1
+        self._ensure_worker()
+        self._queue.put((body, attachment, extension))
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='allure-attach-writer', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is _STOP:
+                    return
+                self._write(*task)
+            except Exception as e:
+                logs.error(f'写入Allure附件失败：{e}')
+            finally:
+                self._queue.task_done()
+
+    def _write(self, body, attachment, extension):
+        data = self.serialise(body)
+        if self.gzip_min_bytes and len(data) >= self.gzip_min_bytes:
+            data = gzip.compress(data)
+            attachment.type = 'application/gzip'
+            attachment.name = f'{attachment.name}(gzip)'
+            extension = f'{extension}.gz'
+            self.stats['compressed'] += 1
+        file_name = ATTACHMENT_PATTERN.format(prefix=hashlib.sha1(data).hexdigest(), ext=extension)
+        if file_name in self._written:
+            self.stats['deduplicated'] += 1
+        else:
+            allure_commons.plugin_manager.hook.report_attached_data(body=data, file_name=file_name)
+            self._written.add(file_name)
+            self.stats['written'] += 1
+        attachment.source = file_name
+
+    def flush(self):
+        """等待队列中的附件全部写入"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self):
+        """写完剩余附件并停止后台线程"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+
+attach_writer = AttachmentWriter()
+atexit.register(attach_writer.close)
+
+
+def attach(body, name=None, attachment_type=None, extension=None):
+    """allure.attach的后台写入版本，见AttachmentWriter.attach"""
+    attach_writer.attach(body, name, attachment_type, extension)
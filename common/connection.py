@@ -1,101 +1,355 @@
+import atexit
+import functools
+import select
+import threading
+import time
 import traceback
-
-import clickhouse_sqlalchemy
-import pymysql
-import redis
 import sys
-import pymongo
-import paramiko
-import pandas as pd
-from clickhouse_sqlalchemy import make_session, exceptions
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+
 from conf.config_util import OperationConfig
 from common.log_util import logs
 
-conf = OperationConfig()
+# 各数据库驱动（pymysql、redis、pymongo、paramiko、pandas、SQLAlchemy等）在首次创建连接时才导入，
+# 纯HTTP接口用例不需要为这些依赖支付导入耗时
 
 
-class ConnectMysql:
+@functools.lru_cache(maxsize=None)
+def _conf():
+    """首次使用时才读取config.ini"""
+    return OperationConfig()
 
-    def __init__(self):
 
-        mysql_conf = {
-            'host': conf.get_section_mysql('host'),
-            'port': int(conf.get_section_mysql('port')),
-            'user': conf.get_section_mysql('username'),
-            'password': conf.get_section_mysql('password'),
-            'database': conf.get_section_mysql('database')
-        }
+class MysqlPool:
+    """
+    有界MySQL连接池，会话内共享：
+    - 最多maxsize个连接，全部占用时等待timeout秒后抛出异常
+    - 空闲超过ping_interval秒的连接复用前先ping，断开则自动重连
+    - 执行时连接已失效（如服务端wait_timeout断开）则丢弃该连接，换新连接重试一次
+    - 使用元组游标，支持参数化查询（%s占位符）
+    """
 
-        try:
-            self.conn = pymysql.connect(**mysql_conf, charset='utf8')
-            # cursor=pymysql.cursors.DictCursor,将数据库表字段显示，以key-value形式展示
-            self.cursor = self.conn.cursor(cursor=pymysql.cursors.DictCursor)
-            logs.info("""成功连接到mysql---
+    # 连接已断开的错误码：2006 MySQL server has gone away，2013 Lost connection，0 连接已关闭
+    _STALE_ERRORS = (0, 2006, 2013)
+
+    def __init__(self, mysql_conf, maxsize=5, timeout=10.0, ping_interval=30.0):
+        self.mysql_conf = mysql_conf
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        # 空闲连接栈：(连接, 归还时间)，后进先出，优先复用最近使用过的连接
+        self._idle = []
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _connect(self):
+        import pymysql
+
+        conn = pymysql.connect(**self.mysql_conf, charset='utf8', autocommit=True)
+        logs.info("""成功连接到mysql---
             host：{host}
             port：{port}
             db：{database}
-            """.format(**mysql_conf))
-        except Exception as e:
-            logs.error(f"except:{e}")
+            """.format(**self.mysql_conf))
+        return conn
+
+    def acquire(self):
+        """获取一个可用连接，用完必须调用release归还"""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError('MySQL连接池已关闭')
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    break
+                if self._created < self.maxsize:
+                    self._created += 1
+                    conn, released_at = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f'等待MySQL连接超时（{self.timeout}s），连接池已满：{self.maxsize}')
+                self._cond.wait(remaining)
+        try:
+            if conn is None:
+                return self._connect()
+            if time.monotonic() - released_at > self.ping_interval:
+                conn.ping(reconnect=True)
+            return conn
+        except Exception:
+            self._discard(conn)
+            raise
+
+    def release(self, conn):
+        """归还连接，连接异常时调用discard丢弃"""
+        with self._cond:
+            if self._closed:
+                self._close_conn(conn)
+                self._created -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn):
+        self._close_conn(conn)
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close_conn(conn):
+        try:
+            if conn is not None:
+                conn.close()
+        except Exception:
+            pass
 
-    def close(self):
-        if self.conn and self.cursor:
-            self.cursor.close()
-            self.conn.close()
-        return True
+    @contextmanager
+    def connection(self):
+        """with mysql_pool().connection() as conn: 自动归还连接，执行出错时丢弃连接"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self._discard(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def _run(self, handler):
+        """在连接上执行handler(cursor)，连接失效时换新连接重试一次"""
+        import pymysql
+
+        for attempt in range(2):
+            conn = self.acquire()
+            try:
+                with conn.cursor() as cursor:
+                    result = handler(cursor)
+            except pymysql.err.OperationalError as e:
+                self._discard(conn)
+                if attempt == 0 and e.args and e.args[0] in self._STALE_ERRORS:
+                    logs.info(f'MySQL连接已失效，重新连接后重试：{e}')
+                    continue
+                raise
+            except BaseException:
+                self._discard(conn)
+                raise
+            self.release(conn)
+            return result
+
+    def execute(self, sql, args=None):
+        """执行增删改语句，返回影响行数"""
+        return self._run(lambda cursor: cursor.execute(sql, args))
+
+    def query(self, sql, args=None):
+        """执行查询，返回全部结果（元组列表）"""
+        def handler(cursor):
+            cursor.execute(sql, args)
+            return cursor.fetchall()
+        return self._run(handler)
+
+    def stream(self, sql, args=None, batch_size=1000):
+        """
+        服务端游标（SSCursor）流式查询，结果不在客户端整体缓存
+        :return: 生成器，逐批产出 (字段名列表, 行元组列表)，每批最多batch_size行；无数据时产出一次空批次
+        """
+        import pymysql
 
-    def query_all(self, sql):
+        for attempt in range(2):
+            conn = self.acquire()
+            cursor = conn.cursor(pymysql.cursors.SSCursor)
+            try:
+                cursor.execute(sql, args)
+            except pymysql.err.OperationalError as e:
+                self._discard(conn)
+                if attempt == 0 and e.args and e.args[0] in self._STALE_ERRORS:
+                    logs.info(f'MySQL连接已失效，重新连接后重试：{e}')
+                    continue
+                raise
+            except BaseException:
+                self._discard(conn)
+                raise
+            break
+
+        finished = False
         try:
-            self.cursor.execute(sql)
-            self.conn.commit()
-            res = self.cursor.fetchall()
+            columns = [column[0] for column in cursor.description or ()]
+            rows = cursor.fetchmany(batch_size)
+            # 第一批为空时也产出一次，调用方可以拿到字段名
+            yield columns, rows
+            while rows:
+                rows = cursor.fetchmany(batch_size)
+                if rows:
+                    yield columns, rows
+            finished = True
+        finally:
+            if finished:
+                cursor.close()
+                self.release(conn)
+            else:
+                # 提前结束或出错时未读完的结果仍在连接上，直接丢弃连接，避免读完剩余数据
+                self._discard(conn)
+
+    def close_all(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_conn(conn)
+
+
+@functools.lru_cache(maxsize=None)
+def mysql_pool():
+    """进程内共享的MySQL连接池，首次使用时按config.ini的[MYSQL]、[MYSQL_POOL]创建"""
+    mysql_conf = {
+        'host': _conf().get_section_mysql('host'),
+        'port': int(_conf().get_section_mysql('port')),
+        'user': _conf().get_section_mysql('username'),
+        'password': _conf().get_section_mysql('password'),
+        'database': _conf().get_section_mysql('database')
+    }
+    pool = MysqlPool(mysql_conf, **_conf().get_mysql_pool())
+    atexit.register(pool.close_all)
+    return pool
 
-            keys = ''
-            values = []
-            for item in res:
-                keys = list(item.keys())
 
-            for ite in res:
-                values.append(list(ite.values()))
+class ConnectMysql:
+    """MySQL操作封装，连接取自会话共享的连接池，不再每次实例化都新建连接"""
 
-            for val in values:
-                # lst_format = [
-                #     keys,
-                #     val
-                # ]
-                lst_format = [
-                    val
-                ]
+    def __init__(self, pool=None):
+        self.pool = pool or mysql_pool()
 
-                return lst_format
-                # return print_table(lst_format)
+    def close(self):
+        """连接由连接池管理，保留该方法兼容旧用法"""
+        return True
 
+    def query_all(self, sql, args=None):
+        """
+        查询全部数据
+        :param sql: SQL语句，参数使用%s占位符
+        :param args: SQL参数，tuple/list/dict
+        :return: 全部行，格式为[[字段值, ...], ...]，无数据返回空列表；查询异常返回None
+        """
+        try:
+            return [list(row) for row in self.iter_query(sql, args)]
         except Exception as e:
             logs.error(e)
+
+    def iter_query(self, sql, args=None, batch_size=1000):
+        """
+        流式查询，逐行产出元组，内存占用与结果集大小无关
+        :param batch_size: 每次从服务端读取的行数
+        """
+        for _, rows in self.pool.stream(sql, args, batch_size):
+            yield from rows
+
+    def iter_columns(self, sql, args=None, batch_size=10000):
+        """流式查询，逐批产出按列组织的数据 {字段名: [值, ...]}"""
+        for columns, rows in self.pool.stream(sql, args, batch_size):
+            if rows:
+                yield dict(zip(columns, map(list, zip(*rows))))
+
+    def query_columns(self, sql, args=None):
+        """
+        查询全部数据并按列组织，不为每行构造dict
+        :return: {字段名: [值, ...]}，无数据时各列为空列表
+        """
+        result = {}
+        for columns, rows in self.pool.stream(sql, args, 10000):
+            if not result:
+                result = {column: [] for column in columns}
+            for column, values in zip(columns, zip(*rows)):
+                result[column].extend(values)
+        return result
+
+    def query_one(self, sql, args=None):
+        """
+        只读取第一行，返回元组，无数据返回None
+        结果多于一行时不读取剩余数据，直接丢弃该连接
+        """
+        # 每批读2行即可判断结果是否已读完：已读完的连接归还连接池，未读完的连接丢弃
+        batches = self.pool.stream(sql, args, 2)
+        try:
+            _, rows = next(batches)
+            if len(rows) < 2:
+                next(batches, None)
+            return rows[0] if rows else None
         finally:
-            self.close()
+            batches.close()
 
-    def delete(self, sql):
+    def exists(self, sql, args=None):
+        """
+        判断查询是否有数据：SELECT语句包装为 SELECT EXISTS(...)，由数据库在命中第一行时返回
+        :return: True/False
+        """
+        statement = str(sql).strip().rstrip(';')
+        if statement[:6].lower() == 'select':
+            rows = self.pool.query(f'SELECT EXISTS({statement})', args)
+            return bool(rows and rows[0][0])
+        return self.query_one(statement, args) is not None
+
+    def exists_many(self, statements):
+        """
+        批量判断多条查询是否有数据，SELECT语句合并为一条 SELECT EXISTS(sql1), EXISTS(sql2), ... 一次往返完成
+        :param statements: [(sql, args)]，args为None、tuple或list；dict参数和非SELECT语句单独执行
+        :return: 与statements一一对应的True/False列表
+        """
+        results = [None] * len(statements)
+        parts, merged_args, positions = [], [], []
+        for position, (sql, args) in enumerate(statements):
+            statement = str(sql).strip().rstrip(';')
+            if statement[:6].lower() == 'select' and not isinstance(args, dict):
+                parts.append((statement, bool(args)))
+                merged_args.extend(args or ())
+                positions.append(position)
+            else:
+                results[position] = self.exists(statement, args)
+        if parts:
+            # 合并后带参数执行时，原本不带参数的语句中的%需要转义；全部不带参数时不传args
+            sql = 'SELECT ' + ', '.join(
+                f"EXISTS({statement if has_args or not merged_args else statement.replace('%', '%%')})"
+                for statement, has_args in parts)
+            rows = self.pool.query(sql, merged_args if merged_args else None)
+            for position, value in zip(positions, rows[0]):
+                results[position] = bool(value)
+        return results
+
+    def delete(self, sql, args=None):
+        """
+        删除数据
+        :param sql: SQL语句，参数使用%s占位符
+        :param args: SQL参数，tuple/list/dict
+        """
         try:
-            self.cursor.execute(sql)
-            self.conn.commit()
+            self.pool.execute(sql, args)
             logs.info('删除成功')
         except Exception as e:
             logs.error(e)
-        finally:
-            self.close()
 
 
 class ConnectRedis:
+    """
+    Redis操作封装，单key操作直接执行；多key操作使用pipeline按batch_size分批发送，
+    transaction=True时每批以MULTI/EXEC事务执行
+    """
 
-    def __init__(self, ip=conf.get_section_redis("host"), port=conf.get_section_redis("port"), username=None,
-                 passwd=None, db=conf.get_section_redis("db")):
+    def __init__(self, ip=None, port=None, username=None, passwd=None, db=None, batch_size=500):
+        import redis
+
+        # 未传入的参数在实例化时从config.ini读取
+        ip = _conf().get_section_redis("host") if ip is None else ip
+        port = _conf().get_section_redis("port") if port is None else port
+        db = _conf().get_section_redis("db") if db is None else db
         self.host = ip
         self.port = port
         self.username = username
         self.password = passwd
         self.db = db
+        self.batch_size = batch_size
         # 使用连接池方式，decode_responses=True可自动转为字符串
         logs.info(f"连接Redis--host:{ip},port:{port},user:{username},password:{passwd},db:{db}")
         try:
@@ -124,8 +378,99 @@ class ConnectRedis:
             logs.error(str(traceback.format_exc()))
 
     def hash_set(self, key, value, ex=None):
+        """
+        写入hash
+        :param key: hash名称
+        :param value: dict，hash的字段和值
+        :param ex: 过期时间，秒
+        """
+        if not isinstance(value, dict):
+            raise TypeError("hash数据必须为dict类型")
         try:
-            return self.first_conn.set(name=key, value=value, ex=ex)
+            with self.first_conn.pipeline(transaction=ex is not None) as pipe:
+                pipe.hset(key, mapping=value)
+                if ex is not None:
+                    pipe.expire(key, ex)
+                return pipe.execute()[0]
+        except Exception:
+            logs.error(str(traceback.format_exc()))
+
+    def _batched(self, items, batch_size=None):
+        batch_size = batch_size or self.batch_size
+        for start in range(0, len(items), batch_size):
+            yield items[start:start + batch_size]
+
+    def _pipeline_execute(self, items, command, transaction=False, batch_size=None):
+        """按批把command(pipe, item)写入pipeline，每批一次往返，返回全部结果"""
+        results = []
+        for batch in self._batched(list(items), batch_size):
+            with self.first_conn.pipeline(transaction=transaction) as pipe:
+                for item in batch:
+                    command(pipe, item)
+                results.extend(pipe.execute())
+        return results
+
+    def mset_kv(self, mapping, ex=None, transaction=False, batch_size=None):
+        """
+        批量写入字符串
+        :param mapping: {key: value}
+        :param ex: 过期时间，秒
+        :param transaction: 每批是否以事务执行
+        :return: 写入成功的数量
+        """
+        try:
+            results = self._pipeline_execute(mapping.items(), lambda pipe, item: pipe.set(item[0], item[1], ex=ex),
+                                             transaction, batch_size)
+            return sum(1 for result in results if result)
+        except Exception:
+            logs.error(str(traceback.format_exc()))
+
+    def mget_kv(self, names, batch_size=None):
+        """
+        批量读取字符串，每批一条MGET命令
+        :return: {key: value}，不存在的key值为None
+        """
+        names = list(names)
+        try:
+            values = []
+            for batch in self._batched(names, batch_size):
+                values.extend(self.first_conn.mget(batch))
+            return dict(zip(names, values))
+        except Exception:
+            logs.error(str(traceback.format_exc()))
+
+    def hash_mset(self, mapping, ex=None, transaction=False, batch_size=None):
+        """
+        批量写入多个hash
+        :param mapping: {hash名称: {字段: 值}}
+        :param ex: 过期时间，秒
+        """
+        def command(pipe, item):
+            pipe.hset(item[0], mapping=item[1])
+            if ex is not None:
+                pipe.expire(item[0], ex)
+
+        try:
+            return self._pipeline_execute(mapping.items(), command, transaction, batch_size)
+        except Exception:
+            logs.error(str(traceback.format_exc()))
+
+    def hash_mgetall(self, names, batch_size=None):
+        """
+        批量读取多个hash的全部字段
+        :return: {hash名称: {字段: 值}}
+        """
+        names = list(names)
+        try:
+            results = self._pipeline_execute(names, lambda pipe, name: pipe.hgetall(name), False, batch_size)
+            return dict(zip(names, results))
+        except Exception:
+            logs.error(str(traceback.format_exc()))
+
+    def delete_keys(self, names, batch_size=None):
+        """批量删除key，每批一条DEL命令，返回删除数量"""
+        try:
+            return sum(self.first_conn.delete(*batch) for batch in self._batched(list(names), batch_size))
         except Exception:
             logs.error(str(traceback.format_exc()))
 
@@ -154,19 +499,24 @@ class ConnectClickHouse:
     """
 
     def __init__(self):
+        from clickhouse_sqlalchemy import make_session
+        from sqlalchemy import create_engine
 
         config = {
-            'server_host': conf.get_section_clickhouse('host'),
-            'port': conf.get_section_clickhouse('port'),
-            'user': conf.get_section_clickhouse('username'),
-            'password': conf.get_section_clickhouse('password'),
-            'db': conf.get_section_clickhouse('db'),
-            'send_receive_timeout': conf.get_section_clickhouse('timeout')
+            'server_host': _conf().get_section_clickhouse('host'),
+            'port': _conf().get_section_clickhouse('port'),
+            'user': _conf().get_section_clickhouse('username'),
+            'password': _conf().get_section_clickhouse('password'),
+            'db': _conf().get_section_clickhouse('db'),
+            'send_receive_timeout': _conf().get_section_clickhouse('timeout')
         }
+        self.engine = None
+        self.session = None
         try:
             connection = 'clickhouse://{user}:{password}@{server_host}:{port}/{db}'.format(**config)
-            engine = create_engine(connection, pool_size=100, pool_recycle=3600, pool_timeout=20)
-            self.session = make_session(engine)
+            self.engine = create_engine(connection, pool_size=100, pool_recycle=3600, pool_timeout=20)
+            # session在多次查询之间保持打开，用完调用close()或使用with语句
+            self.session = make_session(self.engine)
             logs.info("""成功连接到clickhouse--
             server_host：{server_host}
             port：{port}
@@ -176,35 +526,94 @@ class ConnectClickHouse:
         except Exception:
             logs.error(str(traceback.format_exc()))
 
-    def sql(self, sql):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """关闭session并释放连接池"""
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        if self.engine is not None:
+            self.engine.dispose()
+            self.engine = None
+        return True
+
+    def _iter_columns(self, sql, params=None, chunk_size=100000):
         """
+        按块读取查询结果，每块直接转为按列组织的数据
+        :return: 生成器，第一次产出字段名列表，之后逐块产出 {字段名: [值, ...]}
+        """
+        from sqlalchemy import text
+
+        statement = text(sql) if isinstance(sql, str) else sql
+        # stream_results：驱动支持时按块从服务端读取，不在客户端缓存完整结果
+        result = self.session.execute(statement, params or {}, execution_options={'stream_results': True})
+        try:
+            columns = list(result.keys())
+            yield columns
+            while True:
+                rows = result.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield dict(zip(columns, map(list, zip(*rows))))
+        finally:
+            result.close()
+
+    def iter_chunks(self, sql, params=None, chunk_size=100000):
+        """
+        分块查询，逐块产出DataFrame，适合千万级结果集的逐块校验
         :param sql: sql语句后面不要带分号;，有时带上会报错
-        :return:
+        :param params: 绑定参数，sql中使用 :name 占位
+        :param chunk_size: 每块行数
+        """
+        import pandas as pd
+
+        chunks = self._iter_columns(sql, params, chunk_size)
+        columns = next(chunks)
+        for chunk in chunks:
+            yield pd.DataFrame(chunk, columns=columns)
+
+    def sql(self, sql, params=None):
         """
-        cursor = self.session.execute(sql)
+        查询并返回DataFrame：按块读取到各列的列表中再一次性构造DataFrame，不为每行构造dict
+        :param sql: sql语句后面不要带分号;，有时带上会报错
+        :param params: 绑定参数，sql中使用 :name 占位
+        :return: DataFrame，查询异常返回None
+        """
+        import clickhouse_sqlalchemy.exceptions
+        import pandas as pd
+
         try:
-            fields = cursor._metadata.keys
-            df = pd.DataFrame([dict(zip(fields, item)) for item in cursor.fetchall()])
-            return df
+            chunks = self._iter_columns(sql, params)
+            columns = next(chunks)
+            data = {column: [] for column in columns}
+            for chunk in chunks:
+                for column in columns:
+                    data[column].extend(chunk[column])
+            return pd.DataFrame(data, columns=columns)
         except clickhouse_sqlalchemy.exceptions.DatabaseException:
             logs.error('SQL语法错误，请检查SQL语句')
+            self.session.rollback()
         except Exception as e:
-            print(e)
-        finally:
-            cursor.close()
-            self.session.close()
+            logs.error(e)
+            self.session.rollback()
 
 
 class ConnectMongo(object):
 
     def __init__(self):
+        import pymongo
 
         mg_conf = {
-            'host': conf.get_section_mongodb("host"),
-            'port': int(conf.get_section_mongodb("port")),
-            'user': conf.get_section_mongodb("username"),
-            'passwd': conf.get_section_mongodb("password"),
-            'db': conf.get_section_mongodb("database")
+            'host': _conf().get_section_mongodb("host"),
+            'port': int(_conf().get_section_mongodb("port")),
+            'user': _conf().get_section_mongodb("username"),
+            'passwd': _conf().get_section_mongodb("password"),
+            'db': _conf().get_section_mongodb("database")
         }
 
         try:
@@ -234,20 +643,51 @@ class ConnectMongo(object):
         except Exception as e:
             logs.error(e)
 
-    def insert_many_data(self, documents, collection):
+    def insert_many_data(self, documents, collection, ordered=True, batch_size=1000):
         """
-        :param args: 插入多条数据
+        批量插入，每批一次insert_many
+        :param documents: 插入的数据列表
         :param collection:
-        :return:
+        :param ordered: True时遇到错误停止后续插入，False时跳过错误继续插入
+        :param batch_size: 每批文档数
+        :return: 插入成功的_id列表，异常时返回None
         """
         if not isinstance(documents, list):
             raise TypeError("参数必须是一个非空的列表")
-        for item in documents:
-            try:
-                self.use_collection(collection).insert_many([item])
-            except Exception as e:
-                logs.error(e)
-                return None
+        table = self.use_collection(collection)
+        inserted_ids = []
+        try:
+            for start in range(0, len(documents), batch_size):
+                result = table.insert_many(documents[start:start + batch_size], ordered=ordered)
+                inserted_ids.extend(result.inserted_ids)
+            return inserted_ids
+        except Exception as e:
+            logs.error(e)
+            return None
+
+    def bulk_write_data(self, operations, collection, ordered=True, batch_size=1000):
+        """
+        批量写操作，按batch_size分批bulk_write
+        :param operations: pymongo写操作列表，如InsertOne、UpdateOne、DeleteOne、ReplaceOne
+        :param collection:
+        :param ordered: True时按顺序执行，遇到错误停止；False时无序执行，服务端可并行处理
+        :param batch_size: 每批操作数
+        :return: 汇总结果 {'inserted': n, 'matched': n, 'modified': n, 'deleted': n, 'upserted': n}，异常时返回None
+        """
+        table = self.use_collection(collection)
+        summary = {'inserted': 0, 'matched': 0, 'modified': 0, 'deleted': 0, 'upserted': 0}
+        try:
+            for start in range(0, len(operations), batch_size):
+                result = table.bulk_write(operations[start:start + batch_size], ordered=ordered)
+                summary['inserted'] += result.inserted_count
+                summary['matched'] += result.matched_count
+                summary['modified'] += result.modified_count
+                summary['deleted'] += result.deleted_count
+                summary['upserted'] += result.upserted_count
+            return summary
+        except Exception as e:
+            logs.error(e)
+            return None
 
     def query_one_data(self, query_parame, collection):
         """
@@ -291,15 +731,26 @@ class ConnectMongo(object):
         """
         if not isinstance(query_conditions, dict) or not isinstance(after_change, dict):
             raise TypeError("参数必须为dict类型")
-        res = self.query_one_data(query_conditions, collection)
-        if res is not None:
-            try:
-                self.use_collection(collection).update_one(query_conditions, {"$set": after_change})
-            except Exception as e:
-                logs.error(e)
-                return None
-        else:
+        try:
+            # 直接更新，根据matched_count判断查询条件是否存在，不再先查询一次
+            result = self.use_collection(collection).update_one(query_conditions, {"$set": after_change})
+        except Exception as e:
+            logs.error(e)
+            return None
+        if result.matched_count == 0:
             logs.info("查询条件不存在")
+        return result.modified_count
+
+    def update_many_collection(self, changes, collection, ordered=False, batch_size=1000):
+        """
+        批量更新，每条更新为一个UpdateOne，合并为bulk_write执行
+        :param changes: [(查询条件, 需要更改的数据)]
+        :return: bulk_write_data的汇总结果
+        """
+        from pymongo import UpdateOne
+
+        operations = [UpdateOne(query_conditions, {"$set": after_change}) for query_conditions, after_change in changes]
+        return self.bulk_write_data(operations, collection, ordered=ordered, batch_size=batch_size)
 
     def delete_collection(self, search, collection):
         """删除一条数据"""
@@ -325,36 +776,184 @@ class ConnectMongo(object):
             return None
 
 
+class SSHManager:
+    """
+    SSH连接管理：
+    - 按(host, port, username)缓存SSHClient，跨用例复用同一条连接，每条命令在连接上新开一个channel
+    - 开启keepalive，连接断开时下次获取自动重连
+    """
+
+    def __init__(self, keepalive=None):
+        self._keepalive = keepalive
+        self._clients = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @property
+    def keepalive(self):
+        if self._keepalive is None:
+            try:
+                self._keepalive = int(_conf().conf.get('SSH', 'keepalive', fallback='30'))
+            except ValueError:
+                self._keepalive = 30
+        return self._keepalive
+
+    def get_client(self, hostname, port, username, password, timeout):
+        import paramiko
+
+        key = (hostname, port, username)
+        with self._lock:
+            # 每个host单独加锁，多个host可以并行建立连接
+            host_lock = self._locks.setdefault(key, threading.Lock())
+        with host_lock:
+            client = self._clients.get(key)
+            transport = client.get_transport() if client is not None else None
+            if transport is not None and transport.is_active():
+                return client
+            if client is not None:
+                logs.info('{}连接已断开，重新连接'.format(hostname))
+                client.close()
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            client.connect(hostname=hostname, port=port, username=username, password=password, timeout=timeout)
+            if self.keepalive > 0:
+                client.get_transport().set_keepalive(self.keepalive)
+            self._clients[key] = client
+            logs.info('{}服务端连接成功'.format(hostname))
+            return client
+
+    def close_all(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+
+ssh_manager = SSHManager()
+atexit.register(ssh_manager.close_all)
+
+
 class ConnectSSH(object):
-    """连接SSH终端服务"""
+    """连接SSH终端服务，连接由ssh_manager按host缓存复用"""
 
     def __init__(self,
                  host=None,
-                 port=22,
+                 port=None,
                  username=None,
                  password=None,
                  timeout=None):
         self.__conn_info = {
-            'hostname': conf.get_section_ssh('host') if host is None else host,
-            'port': int(conf.get_section_ssh('port')) if port is not None else port,
-            'username': conf.get_section_ssh('username') if username is None else username,
-            'password': conf.get_section_ssh('password') if password is None else password,
-            'timeout': int(conf.get_section_ssh('timeout')) if timeout is None else timeout
+            'hostname': _conf().get_section_ssh('host') if host is None else host,
+            'port': int(_conf().get_section_ssh('port')) if port is None else int(port),
+            'username': _conf().get_section_ssh('username') if username is None else username,
+            'password': _conf().get_section_ssh('password') if password is None else password,
+            'timeout': int(_conf().get_section_ssh('timeout')) if timeout is None else timeout
         }
+        self.__client = ssh_manager.get_client(**self.__conn_info)
+        # 最近一次iter_output/execute命令的退出码
+        self.exit_status = None
 
-        self.__client = paramiko.SSHClient()
-        self.__client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self.__client.connect(**self.__conn_info)
-
-        if self.__client:
-            logs.info('{}服务端连接成功'.format(self.__conn_info['hostname']))
+    @property
+    def host(self):
+        return self.__conn_info['hostname']
 
     def get_ssh_content(self, command=None):
         stdin, stdout, stderr = self.__client.exec_command(
-            command if command is not None else conf.get_section_ssh('command'))
-        content = stdout.read().decode()
+            command if command is not None else _conf().get_section_ssh('command'))
+        try:
+            content = stdout.read().decode()
+        finally:
+            stdout.channel.close()
         return content
 
+    def iter_output(self, command=None, chunk_size=32768):
+        """
+        流式读取命令输出，适合tail大日志文件，不把完整输出读入内存
+        :param command: 执行的命令，默认取config.ini的[SSH] command
+        :param chunk_size: 每次从channel读取的字节数
+        :return: 生成器，逐行产出 ('stdout'或'stderr', 行内容)，结束后exit_status为命令退出码
+        """
+        command = command if command is not None else _conf().get_section_ssh('command')
+        channel = self.__client.get_transport().open_session()
+        channel.exec_command(command)
+        readers = {'stdout': (channel.recv_ready, channel.recv), 'stderr': (channel.recv_stderr_ready, channel.recv_stderr)}
+        buffers = {'stdout': b'', 'stderr': b''}
+        try:
+            while True:
+                received = False
+                for stream, (ready, recv) in readers.items():
+                    if not ready():
+                        continue
+                    data = recv(chunk_size)
+                    if not data:
+                        continue
+                    received = True
+                    *lines, buffers[stream] = (buffers[stream] + data).split(b'\n')
+                    for line in lines:
+                        yield stream, line.decode('utf-8', errors='replace')
+                if received:
+                    continue
+                if channel.exit_status_ready() and channel.eof_received \
+                        and not channel.recv_ready() and not channel.recv_stderr_ready():
+                    break
+                # 没有数据可读时等待channel可读，避免空转
+                select.select([channel], [], [], 0.1)
+            for stream, rest in buffers.items():
+                if rest:
+                    yield stream, rest.decode('utf-8', errors='replace')
+            self.exit_status = channel.recv_exit_status()
+        finally:
+            channel.close()
+
+    def iter_stdout(self, command=None):
+        """流式逐行读取命令的标准输出"""
+        for stream, line in self.iter_output(command):
+            if stream == 'stdout':
+                yield line
+
+    def execute(self, command=None):
+        """
+        执行命令并收集输出
+        :return: {'exit_status': 退出码, 'stdout': 标准输出, 'stderr': 错误输出}
+        """
+        output = {'stdout': [], 'stderr': []}
+        for stream, line in self.iter_output(command):
+            output[stream].append(line)
+        return {'exit_status': self.exit_status,
+                'stdout': '\n'.join(output['stdout']),
+                'stderr': '\n'.join(output['stderr'])}
+
+    @staticmethod
+    def run_on_hosts(hosts, command=None, max_workers=8, **conn_info):
+        """
+        多线程在多台服务器上执行同一条命令，例如用例失败后在各节点grep日志
+        :param hosts: 主机列表，元素为host字符串或ConnectSSH参数的dict（如{'host': ..., 'port': ...}）
+        :param command: 执行的命令，默认取config.ini的[SSH] command
+        :param max_workers: 最大线程数
+        :param conn_info: 各主机共用的连接参数，如username、password
+        :return: {host: {'exit_status', 'stdout', 'stderr', 'error'}}，按hosts顺序排列
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        def run(host):
+            options = dict(conn_info, **host) if isinstance(host, dict) else dict(conn_info, host=host)
+            try:
+                result = ConnectSSH(**options).execute(command)
+                result['error'] = None
+            except Exception as e:
+                logs.error('{}执行命令失败：{}'.format(options.get('host'), e))
+                result = {'exit_status': None, 'stdout': '', 'stderr': '', 'error': str(e)}
+            return options.get('host'), result
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(hosts) or 1))) as executor:
+            results = dict(executor.map(run, hosts))
+        failed = [host for host, result in results.items() if result['error']]
+        logs.info('多主机执行命令完成，主机{}台，连接或执行异常{}台：{}'.format(len(results), len(failed), failed))
+        return results
+
 
 class ConnectOracle:
     def __init__(self):
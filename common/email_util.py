@@ -1,9 +1,12 @@
+import datetime
 import os
+import shutil
 import smtplib
 from email.mime.application import MIMEApplication  # 附件
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 
+from conf import setting
 from conf.config_util import OperationConfig
 from common.log_util import logs
 
@@ -146,3 +149,51 @@ class BuildEmail(SendEmail):
             % (total, success_num, fail_num, error_num, notrun_num, pass_result, fail_result, err_result)
         )
         self.build_content(subject, content, addressee, atta_file)
+
+
+def should_send_email():
+    """检查是否启用邮件发送功能"""
+    enable_str = conf.get_section_for_data('EMAIL', 'enable')
+    return str(enable_str).strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+def build_report_attachment(allure_dir=None):
+    """
+    构建测试报告附件：allure报告打包为zip，tm报告直接使用html文件
+    :param allure_dir: allure结果目录，默认为FILE_PATH['TEMP']
+    """
+    if setting.REPORT_TYPE == 'allure':
+        allure_dir = allure_dir or setting.FILE_PATH['TEMP']
+        if not os.path.isdir(allure_dir) or not os.listdir(allure_dir):
+            return None
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        archive_base = os.path.join(os.path.dirname(os.path.abspath(allure_dir)),
+                                    f"{os.path.basename(os.path.abspath(allure_dir))}_{timestamp}")
+        return shutil.make_archive(archive_base, 'zip', allure_dir)
+    if setting.REPORT_TYPE == 'tm':
+        report_file = os.path.join(setting.FILE_PATH['TMR'], 'testReport.html')
+        if os.path.exists(report_file):
+            return report_file
+    return None
+
+
+def send_summary_email(summary, allure_dir=None):
+    """发送测试结果摘要邮件，附带测试报告；未启用邮件时直接返回"""
+    if not should_send_email():
+        return
+
+    attachment = build_report_attachment(allure_dir)
+    attachments = [attachment] if attachment else None
+    subject = conf.get_section_for_data('EMAIL', 'subject') or '接口自动化测试报告'
+
+    try:
+        sender = SendEmail()
+        sender.build_content(subject, summary, atta_file=attachments)
+    except Exception as exc:  # pragma: no cover - 不影响测试用例执行
+        logs.error('发送测试报告邮件失败: %s', exc, exc_info=True)
+    finally:
+        if attachment and attachment.endswith('.zip') and os.path.exists(attachment):
+            try:
+                os.remove(attachment)
+            except OSError:
+                logs.warning('临时报告压缩包删除失败: %s', attachment)
@@ -0,0 +1,273 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import traceback
+
+import yaml
+
+from common.log_util import logs
+from conf.config_util import OperationConfig
+from conf.setting import FILE_PATH
+
+# 全局命名空间，所有进程共享；worker命名空间仅当前pytest-xdist worker可见
+GLOBAL_SCOPE = 'global'
+WORKER_SCOPE = 'worker'
+
+
+def current_worker():
+    """当前pytest-xdist worker编号（如gw0），非xdist运行时为main"""
+    return os.environ.get('PYTEST_XDIST_WORKER', 'main')
+
+
+class _MemoryBackend:
+    """进程内字典存储，读写O(1)"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.RLock()
+
+    def get(self, namespace, key, default):
+        return self._data.get(namespace, {}).get(key, default)
+
+    def contains(self, namespace, key):
+        return key in self._data.get(namespace, {})
+
+    def put(self, namespace, key, value, overwrite):
+        with self._lock:
+            bucket = self._data.setdefault(namespace, {})
+            if not overwrite and key in bucket:
+                return False
+            bucket[key] = value
+            return True
+
+    def compare_and_set(self, namespace, key, expected, value):
+        with self._lock:
+            bucket = self._data.setdefault(namespace, {})
+            if bucket.get(key) != expected:
+                return False
+            bucket[key] = value
+            return True
+
+    def snapshot(self, namespace):
+        with self._lock:
+            return dict(self._data.get(namespace, {}))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class _SqliteBackend:
+    """
+    SQLite（WAL模式）存储，供pytest-xdist多进程共享：
+    - 每个线程独立连接，写操作使用BEGIN IMMEDIATE保证原子性
+    - 值以JSON保存，(namespace, key)为主键
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS extract ('
+                         'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT, '
+                         'PRIMARY KEY (namespace, key))')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _dumps(value):
+        return json.dumps(value, ensure_ascii=False, default=str)
+
+    def get(self, namespace, key, default):
+        row = self._connect().execute('SELECT value FROM extract WHERE namespace=? AND key=?',
+                                      (namespace, key)).fetchone()
+        return json.loads(row[0]) if row is not None else default
+
+    def contains(self, namespace, key):
+        return self._connect().execute('SELECT 1 FROM extract WHERE namespace=? AND key=?',
+                                       (namespace, key)).fetchone() is not None
+
+    def put(self, namespace, key, value, overwrite):
+        verb = 'INSERT OR REPLACE' if overwrite else 'INSERT OR IGNORE'
+        cursor = self._connect().execute(f'{verb} INTO extract (namespace, key, value) VALUES (?, ?, ?)',
+                                         (namespace, key, self._dumps(value)))
+        return cursor.rowcount > 0
+
+    def compare_and_set(self, namespace, key, expected, value):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            current = self.get(namespace, key, None)
+            if current != expected:
+                conn.execute('ROLLBACK')
+                return False
+            conn.execute('INSERT OR REPLACE INTO extract (namespace, key, value) VALUES (?, ?, ?)',
+                         (namespace, key, self._dumps(value)))
+            conn.execute('COMMIT')
+            return True
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def snapshot(self, namespace):
+        rows = self._connect().execute('SELECT key, value FROM extract WHERE namespace=?', (namespace,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def clear(self):
+        self._connect().execute('DELETE FROM extract')
+
+
+class ExtractStore:
+    """
+    接口关联数据存储：
+    - memory后端以进程内字典为唯一数据源，get/put均为O(1)，首次访问时从extract.yaml加载一次
+    - sqlite后端供pytest-xdist多进程共享，支持全局/worker两级命名空间和原子的compare_and_set
+    - put默认覆盖同名key，overwrite=False时保留已有值
+    - persist=True时只在checkpoint()检查点整体写回extract.yaml（write-behind）
+    """
+
+    def __init__(self, file_path=None, persist=True, backend=None):
+        self.file_path = file_path or FILE_PATH['EXTRACT']
+        self.persist = persist
+        self.backend = backend or _MemoryBackend()
+        self._lock = threading.RLock()
+        # sqlite后端以数据库为准，不从extract.yaml加载
+        self._loaded = not isinstance(self.backend, _MemoryBackend)
+        self._dirty = False
+
+    def _ensure_loaded(self):
+        """首次访问时加载一次extract.yaml，兼容脱离pytest会话单独调用的场景"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                if os.path.exists(self.file_path):
+                    with open(self.file_path, 'r', encoding='utf-8') as rf:
+                        data = yaml.safe_load(rf)
+                    if isinstance(data, dict):
+                        for key, value in data.items():
+                            self.backend.put(GLOBAL_SCOPE, key, value, True)
+            except Exception:
+                logs.error(str(traceback.format_exc()))
+            self._loaded = True
+
+    @staticmethod
+    def _namespace(scope):
+        return current_worker() if scope == WORKER_SCOPE else GLOBAL_SCOPE
+
+    def get(self, key, default=None):
+        """优先读取当前worker命名空间，再读取全局命名空间"""
+        self._ensure_loaded()
+        worker = current_worker()
+        if self.backend.contains(worker, key):
+            return self.backend.get(worker, key, default)
+        return self.backend.get(GLOBAL_SCOPE, key, default)
+
+    def put(self, key, value, overwrite=True, scope=GLOBAL_SCOPE):
+        """
+        写入单个关联参数
+        :param key: 参数名
+        :param value: 参数值
+        :param overwrite: 同名key已存在时是否覆盖
+        :param scope: global写入全局命名空间，worker仅当前worker可见
+        :return: 是否写入成功
+        """
+        self._ensure_loaded()
+        written = self.backend.put(self._namespace(scope), key, value, overwrite)
+        if written:
+            self._dirty = True
+        else:
+            logs.info('extract参数【%s】已存在，不覆盖' % key)
+        return written
+
+    def update(self, mapping, overwrite=True, scope=GLOBAL_SCOPE):
+        """批量写入关联参数，mapping必须为dict"""
+        if not isinstance(mapping, dict):
+            logs.info('写入extract的数据必须为dict格式')
+            return False
+        with self._lock:
+            for key, value in mapping.items():
+                self.put(key, value, overwrite=overwrite, scope=scope)
+        return True
+
+    def compare_and_set(self, key, expected, value, scope=GLOBAL_SCOPE):
+        """
+        原子地比较并写入：当前值等于expected（不存在视为None）时写入value
+        :return: 是否写入成功
+        """
+        self._ensure_loaded()
+        written = self.backend.compare_and_set(self._namespace(scope), key, expected, value)
+        if written:
+            self._dirty = True
+        return written
+
+    def __contains__(self, key):
+        self._ensure_loaded()
+        return self.backend.contains(current_worker(), key) or self.backend.contains(GLOBAL_SCOPE, key)
+
+    def snapshot(self, scope=GLOBAL_SCOPE):
+        """返回指定命名空间数据的拷贝"""
+        self._ensure_loaded()
+        return self.backend.snapshot(self._namespace(scope))
+
+    def clear(self):
+        """清空全部命名空间和extract.yaml文件，xdist运行时只应由主进程调用一次"""
+        with self._lock:
+            self.backend.clear()
+            self._loaded = True
+            self._dirty = False
+            try:
+                with open(self.file_path, 'w', encoding='utf-8') as f:
+                    f.truncate()
+            except Exception:
+                logs.error(str(traceback.format_exc()))
+
+    def checkpoint(self):
+        """检查点：将全局命名空间整体写回extract.yaml，先写临时文件再替换，避免写一半的文件"""
+        if not self.persist:
+            return
+        if isinstance(self.backend, _MemoryBackend) and not self._dirty:
+            return
+        with self._lock:
+            tmp_path = f'{self.file_path}.{os.getpid()}.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    yaml.safe_dump(self.backend.snapshot(GLOBAL_SCOPE), f, allow_unicode=True, sort_keys=False)
+                os.replace(tmp_path, self.file_path)
+                self._dirty = False
+            except Exception:
+                logs.error(str(traceback.format_exc()))
+
+
+def _create_store():
+    conf = OperationConfig()
+    persist = conf.get_section_for_data('EXTRACT', 'persist')
+    persist = str(persist).strip().lower() in {"1", "true", "yes", "y", "on"}
+    backend_name = conf.conf.get('EXTRACT', 'backend', fallback='auto').strip().lower()
+    # auto：pytest-xdist worker进程使用sqlite共享数据，其余情况使用内存
+    if backend_name == 'sqlite' or (backend_name == 'auto' and 'PYTEST_XDIST_WORKER' in os.environ):
+        return ExtractStore(persist=persist, backend=_SqliteBackend(FILE_PATH['EXTRACT_DB']))
+    return ExtractStore(persist=persist)
+
+
+def reset_shared_store():
+    """清空多进程共享的sqlite数据，由主进程在会话开始时调用一次"""
+    db_path = FILE_PATH['EXTRACT_DB']
+    if os.path.exists(db_path):
+        _SqliteBackend(db_path).clear()
+
+
+extract_store = _create_store()
+# 进程退出前兜底落盘一次
+atexit.register(extract_store.checkpoint)
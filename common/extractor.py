@@ -0,0 +1,275 @@
+import functools
+import re
+
+import jsonpath
+
+from common.log_util import logs
+from common.response_util import wrap_response
+
+# 判断extract表达式是否为正则：包含常见捕获组写法或任意括号分组，且不以$开头
+_REGEX_HINTS = [r'(\d+)', r'(\d*)', '(.*?)', '(.+?)']
+_GROUP_PATTERN = re.compile(r'\(.+?\)')
+# JSONPath分段：..name、..*、.name、.*、[n]、[*]、['name']、["name"]
+_JSONPATH_TOKEN = re.compile(r"""\.\.(?P<desc>[^.\[\]]+)|\.(?P<key>[^.\[\]]+)|\[(?P<index>\d+|\*)\]|\[(?P<quote>['"])(?P<qkey>.*?)(?P=quote)\]""")
+
+_MISSING = object()
+
+
+def safe_to_int(s):
+    """仅在纯数字时转 int，否则原样返回字符串"""
+    try:
+        return int(s) if isinstance(s, str) and s.isdigit() else s
+    except Exception:
+        return s
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_jsonpath(expression):
+    """
+    将JSONPath编译为步骤元组，如 $.goodsList[*].goodsId -> (('key','goodsList'), ('wild',None), ('key','goodsId'))
+    过滤器、切片、并集等不支持的语法返回None，由jsonpath库逐条求值
+    """
+    expression = expression.strip()
+    if not expression.startswith('$') or expression == '$':
+        return None
+    steps = []
+    pos = 1
+    while pos < len(expression):
+        match = _JSONPATH_TOKEN.match(expression, pos)
+        if match is None:
+            return None
+        if match.group('desc') is not None:
+            name = match.group('desc')
+            steps.append(('desc', None if name == '*' else name))
+        elif match.group('key') is not None:
+            name = match.group('key')
+            steps.append(('wild', None) if name == '*' else ('key', name))
+        elif match.group('index') is not None:
+            index = match.group('index')
+            steps.append(('wild', None) if index == '*' else ('index', int(index)))
+        else:
+            steps.append(('key', match.group('qkey')))
+        pos = match.end()
+    return tuple(steps)
+
+
+def _children(node):
+    if isinstance(node, dict):
+        return node.values()
+    if isinstance(node, list):
+        return node
+    return ()
+
+
+class _PathTrie:
+    """多条JSONPath按相同前缀合并成的前缀树，terminals为在此结束的路径序号"""
+    __slots__ = ('terminals', 'edges')
+
+    def __init__(self):
+        self.terminals = []
+        self.edges = []
+
+    def child(self, step):
+        for edge_step, sub in self.edges:
+            if edge_step == step:
+                return sub
+        sub = _PathTrie()
+        self.edges.append((step, sub))
+        return sub
+
+
+def _walk(node, trie, results):
+    for index in trie.terminals:
+        results[index].append(node)
+    for (kind, arg), sub in trie.edges:
+        if kind == 'key':
+            if isinstance(node, dict) and arg in node:
+                _walk(node[arg], sub, results)
+        elif kind == 'index':
+            if isinstance(node, list) and arg < len(node):
+                _walk(node[arg], sub, results)
+        elif kind == 'wild':
+            for child in _children(node):
+                _walk(child, sub, results)
+        else:
+            _descend(node, arg, sub, results)
+
+
+def _descend(node, name, trie, results):
+    """..递归下降：先取当前层命中，再按顺序深入子节点，与jsonpath库的结果顺序一致"""
+    if name is None:
+        for child in _children(node):
+            _walk(child, trie, results)
+    elif isinstance(node, dict) and name in node:
+        _walk(node[name], trie, results)
+    for child in _children(node):
+        if isinstance(child, (dict, list)):
+            _descend(child, name, trie, results)
+
+
+def evaluate_jsonpaths(data, compiled):
+    """
+    同时求值多条已编译的JSONPath：路径按公共前缀合并，共享前缀（如$.goodsList[*]）只遍历一次
+    :param data: 解析后的响应体
+    :param compiled: 编译后的步骤元组列表
+    :return: 与compiled一一对应的命中值列表，顺序与jsonpath库一致
+    """
+    root = _PathTrie()
+    for index, steps in enumerate(compiled):
+        trie = root
+        for step in steps:
+            trie = trie.child(step)
+        trie.terminals.append(index)
+    results = [[] for _ in compiled]
+    _walk(data, root, results)
+    return results
+
+
+class ExtractRule:
+    """
+    单条提取规则：key为写入extract的参数名，kind为regex或jsonpath，multi为True时提取全部命中值
+    按正则提取且表达式中含$时，正则未命中再按JSONPath提取（fallback_jsonpath），与原有提取逻辑一致
+    """
+
+    def __init__(self, key, expression, multi=False):
+        self.key = key
+        self.expression = expression
+        self.multi = multi
+        self.kind = None
+        self.pattern = None
+        self.steps = None
+        self.fallback_jsonpath = False
+        expression = str(expression)
+        stripped = expression.strip()
+        is_regex = bool(_GROUP_PATTERN.search(expression))
+        if not multi:
+            is_regex = is_regex or any(hint in expression for hint in _REGEX_HINTS)
+        if is_regex and not stripped.startswith('$'):
+            try:
+                self.pattern = re.compile(expression, re.S)
+                self.kind = 'regex'
+                self.fallback_jsonpath = '$' in expression
+            except re.error as e:
+                logs.error(f'extract正则表达式【{expression}】编译失败: {e}')
+                if '$' in expression:
+                    self.kind = 'jsonpath'
+                    self.steps = compile_jsonpath(expression)
+        elif '$' in expression:
+            self.kind = 'jsonpath'
+            self.steps = compile_jsonpath(expression)
+
+    def __repr__(self):
+        return f"ExtractRule({self.key!r}, {self.expression!r}, kind={self.kind!r}, multi={self.multi})"
+
+
+class ExtractPlan:
+    """
+    一个用例的全部提取规则（extract + extract_list）：
+    - 正则预编译，JSONPath预编译为步骤元组
+    - 可编译的JSONPath按公共前缀合并后一次遍历求值，不可编译的（过滤器、切片等）回退到jsonpath库
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._compiled_rules = [rule for rule in rules if rule.kind == 'jsonpath' and rule.steps is not None]
+
+    def _jsonpath_values(self, response):
+        """返回 {rule: 命中值列表}，响应不是JSON时返回None"""
+        body = response.body
+        if body is None:
+            return None
+        values = dict(zip(self._compiled_rules, evaluate_jsonpaths(body, [rule.steps for rule in self._compiled_rules])))
+        for rule in self.rules:
+            if rule.kind == 'jsonpath' and rule.steps is None:
+                matched = jsonpath.jsonpath(body, rule.expression)
+                values[rule] = matched if isinstance(matched, list) else []
+        return values
+
+    def apply(self, response):
+        """
+        按规则提取响应数据
+        :param response: ResponseWrapper或响应文本
+        :return: {参数名: 提取结果}，提取失败的规则按原有约定写入提示信息
+        """
+        response = wrap_response(response)
+        extracted = {}
+        json_values = _MISSING
+        for rule in self.rules:
+            if rule.kind == 'regex':
+                try:
+                    if rule.multi:
+                        found = rule.pattern.findall(response.text)
+                        if found:
+                            extracted[rule.key] = [safe_to_int(item) for item in found]
+                            logs.info('正则提取到的参数：%s' % {rule.key: extracted[rule.key]})
+                    else:
+                        match = rule.pattern.search(response.text)
+                        if match:
+                            extracted[rule.key] = safe_to_int(match.group(1))
+                except Exception as e:
+                    logs.error(f'正则提取异常: {e}')
+                if rule.key in extracted:
+                    continue
+                if rule.fallback_jsonpath:
+                    self._store_jsonpath(rule, self._fallback_values(rule, response), extracted)
+                else:
+                    logs.error(f'extract未提取到数据：参数【{rule.key}】正则表达式【{rule.expression}】无匹配结果')
+            elif rule.kind == 'jsonpath':
+                if json_values is _MISSING:
+                    try:
+                        json_values = self._jsonpath_values(response)
+                    except Exception as e:
+                        logs.error(f'JSONPath 提取失败: {e}')
+                        json_values = None
+                self._store_jsonpath(rule, None if json_values is None else json_values.get(rule, []), extracted)
+        return extracted
+
+    @staticmethod
+    def _fallback_values(rule, response):
+        """正则未命中时按JSONPath求值，返回命中值列表，响应不是JSON或表达式异常时返回None"""
+        try:
+            body = response.body
+            if body is None:
+                return None
+            matched = jsonpath.jsonpath(body, rule.expression)
+            return matched if isinstance(matched, list) else []
+        except Exception as e:
+            logs.error(f'JSONPath 提取失败: {e}')
+            return None
+
+    @staticmethod
+    def _store_jsonpath(rule, matched, extracted):
+        """按原有约定写入JSONPath提取结果，matched为None表示响应非JSON或JSONPath异常"""
+        if matched is None:
+            extracted[rule.key] = f'未提取到数据，响应非JSON或JSONPath异常: {rule.expression}'
+        elif rule.multi:
+            if matched:
+                extracted[rule.key] = matched
+                logs.info('json提取到参数：%s' % {rule.key: matched})
+            else:
+                extracted[rule.key] = "未提取到数据，该接口返回结果可能为空"
+                logs.info('json提取为空：%s' % {rule.key: rule.expression})
+        elif matched:
+            extracted[rule.key] = matched[0]
+        else:
+            extracted[rule.key] = f'未提取到数据，JSONPath无结果: {rule.expression}'
+            logs.error(f'extract未提取到数据：参数【{rule.key}】JSONPath【{rule.expression}】无结果')
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_plan(extract_items, extract_list_items):
+    rules = [ExtractRule(key, value) for key, value in extract_items]
+    rules.extend(ExtractRule(key, value, multi=True) for key, value in extract_list_items)
+    return ExtractPlan(rules)
+
+
+def compile_extract(extract=None, extract_list=None):
+    """
+    编译用例的extract和extract_list，相同的提取配置只编译一次
+    :param extract: yaml中的extract，提取第一个命中值
+    :param extract_list: yaml中的extract_list，提取全部命中值
+    :return: ExtractPlan
+    """
+    extract_items = tuple((key, str(value)) for key, value in (extract or {}).items())
+    extract_list_items = tuple((key, str(value)) for key, value in (extract_list or {}).items())
+    return _compile_plan(extract_items, extract_list_items)
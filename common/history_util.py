@@ -0,0 +1,271 @@
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from common.two_dimension_data import print_table
+from conf.setting import FILE_PATH
+
+# 主进程生成的运行ID，通过环境变量传给pytest-xdist worker
+RUN_ID_ENV = 'RUN_HISTORY_ID'
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS runs ('
+    'run_id TEXT PRIMARY KEY, started_at REAL, finished_at REAL, machine TEXT, '
+    'total INTEGER, failed INTEGER)',
+    'CREATE TABLE IF NOT EXISTS case_results ('
+    'run_id TEXT NOT NULL, nodeid TEXT NOT NULL, api_name TEXT, status TEXT, duration REAL, '
+    'setup REAL, call REAL, teardown REAL, request_time REAL, ttfb REAL, requests INTEGER, '
+    'bytes_in INTEGER, bytes_out INTEGER, host TEXT, worker TEXT, finished_at REAL, '
+    'PRIMARY KEY (run_id, nodeid))',
+    'CREATE INDEX IF NOT EXISTS idx_case_results_nodeid ON case_results (nodeid, finished_at)',
+)
+
+
+def canonical_nodeid(nodeid):
+    """去掉pytest-xdist按xdist_group分组时追加在nodeid末尾的@分组名，使并行与串行运行的历史可以对比"""
+    head, sep, tail = nodeid.rpartition('@')
+    if sep and ']' not in tail and '::' in head:
+        return head
+    return nodeid
+
+
+class _CaseRecord:
+    """一条用例在各阶段的耗时与结果，logfinish时结合接口请求数据写入"""
+    __slots__ = ('phases', 'status')
+
+    def __init__(self):
+        self.phases = {}
+        self.status = 'passed'
+
+
+class RunHistory:
+    """
+    运行历史库（SQLite，WAL模式）：
+    - runs：每次运行一行，由主进程在会话开始/结束时写入
+    - case_results：每条用例一行，含各阶段耗时、接口请求耗时、流量、状态和接口host
+    - 用例结果先缓存在内存，会话结束时一次性批量写入；xdist各worker各自写入自己的用例
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or FILE_PATH['RUN_HISTORY']
+        self.run_id = None
+        # xdist主进程只汇总worker的报告，置为False后不记录用例
+        self.record_cases = True
+        self._cases = {}
+        self._pending = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def connect(self):
+        """打开数据库连接，正常退出时提交事务，最后关闭连接"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def start_run(self, run_id=None):
+        """主进程调用：生成运行ID并写入runs，worker通过环境变量沿用同一ID"""
+        self.run_id = run_id or os.environ.get(RUN_ID_ENV) or time.strftime('%Y%m%d%H%M%S-') + uuid.uuid4().hex[:6]
+        os.environ[RUN_ID_ENV] = self.run_id
+        with self.connect() as conn:
+            conn.execute('INSERT OR IGNORE INTO runs (run_id, started_at, machine) VALUES (?, ?, ?)',
+                         (self.run_id, time.time(), socket.gethostname()))
+
+    def join_run(self):
+        """worker调用：沿用主进程的运行ID"""
+        self.run_id = os.environ.get(RUN_ID_ENV)
+
+    def add_report(self, report):
+        """pytest_runtest_logreport中调用，累计用例setup/call/teardown耗时和结果"""
+        if not self.record_cases:
+            return
+        record = self._cases.setdefault(canonical_nodeid(report.nodeid), _CaseRecord())
+        record.phases[report.when] = report.duration
+        if report.failed:
+            record.status = 'failed' if report.when == 'call' else 'error'
+        elif report.skipped and record.status == 'passed':
+            record.status = 'skipped'
+
+    def finish_case(self, nodeid, requests):
+        """
+        pytest_runtest_logfinish中调用，记录一条用例
+        :param requests: 用例执行期间的接口请求 [(api_name, url, RequestTiming)]
+        """
+        nodeid = canonical_nodeid(nodeid)
+        record = self._cases.pop(nodeid, None)
+        if record is None or self.run_id is None:
+            return
+        timings = [timing for _, _, timing in requests if timing is not None]
+        api_name = requests[0][0] if requests else None
+        host = None
+        if requests and requests[0][1]:
+            parts = urlsplit(requests[0][1])
+            host = f'{parts.scheme}://{parts.netloc}'
+        phases = record.phases
+        with self._lock:
+            self._pending.append((
+                self.run_id, nodeid, api_name, record.status, sum(phases.values()),
+                phases.get('setup', 0), phases.get('call', 0), phases.get('teardown', 0),
+                sum(t.total for t in timings), sum(t.ttfb for t in timings), len(requests),
+                sum(t.bytes_in for t in timings), sum(t.bytes_out for t in timings), host,
+                os.environ.get('PYTEST_XDIST_WORKER', 'main'), time.time(),
+            ))
+
+    def flush(self):
+        """把缓存的用例结果批量写入数据库"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        with self.connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO case_results VALUES (%s)' % ', '.join('?' * 16), pending)
+
+    def finish_run(self, total, failed):
+        """主进程在会话结束时调用，更新运行的结束时间和结果统计"""
+        if self.run_id is None:
+            return
+        with self.connect() as conn:
+            conn.execute('UPDATE runs SET finished_at = ?, total = ?, failed = ? WHERE run_id = ?',
+                         (time.time(), total, failed, self.run_id))
+
+    # ---------- 查询 ----------
+
+    def recent_runs(self, limit):
+        """最近limit次记录了用例结果的运行，全部用例被取消选择等没有执行用例的运行不计入"""
+        with self.connect() as conn:
+            return [row[0] for row in conn.execute(
+                'SELECT run_id FROM runs r WHERE EXISTS (SELECT 1 FROM case_results c WHERE c.run_id = r.run_id) '
+                'ORDER BY started_at DESC LIMIT ?', (limit,))]
+
+    def durations(self, run_ids, keyword=None):
+        """返回 {nodeid: [(run_id, duration, status, api_name)]}，按运行先后排列"""
+        if not run_ids:
+            return {}
+        sql = ('SELECT c.nodeid, c.run_id, c.duration, c.status, c.api_name FROM case_results c '
+               'JOIN runs r ON r.run_id = c.run_id WHERE c.run_id IN (%s)' % ', '.join('?' * len(run_ids)))
+        args = list(run_ids)
+        if keyword:
+            sql += ' AND (c.nodeid LIKE ? OR c.api_name LIKE ?)'
+            args += [f'%{keyword}%', f'%{keyword}%']
+        sql += ' ORDER BY r.started_at'
+        result = {}
+        with self.connect() as conn:
+            for nodeid, run_id, duration, status, api_name in conn.execute(sql, args):
+                result.setdefault(nodeid, []).append((run_id, duration, status, api_name))
+        return result
+
+    def slowest(self, runs=10, limit=20, keyword=None):
+        """最近runs次运行中平均耗时最长的用例：[(nodeid, api_name, 次数, 平均, 最大)]"""
+        rows = []
+        for nodeid, history in self.durations(self.recent_runs(runs), keyword).items():
+            values = [duration for _, duration, _, _ in history]
+            rows.append((nodeid, history[-1][3], len(values), statistics.mean(values), max(values)))
+        return sorted(rows, key=lambda row: row[3], reverse=True)[:limit]
+
+    def regressed(self, baseline_runs=5, min_samples=3, limit=20, keyword=None):
+        """
+        最近一次运行相对之前baseline_runs次运行的耗时中位数变慢最多的用例
+        :return: [(nodeid, api_name, 基线中位数, 本次耗时, 变化比例)]，只包含基线样本数不少于min_samples的用例
+        """
+        run_ids = self.recent_runs(baseline_runs + 1)
+        if len(run_ids) < 2:
+            return []
+        latest = run_ids[0]
+        rows = []
+        for nodeid, history in self.durations(run_ids, keyword).items():
+            current = [duration for run_id, duration, _, _ in history if run_id == latest]
+            baseline = [duration for run_id, duration, status, _ in history if run_id != latest and status == 'passed']
+            if not current or len(baseline) < min_samples:
+                continue
+            median = statistics.median(baseline)
+            rows.append((nodeid, history[-1][3], median, current[0], (current[0] - median) / median if median else 0))
+        return sorted(rows, key=lambda row: row[4], reverse=True)[:limit]
+
+    def average_durations(self, runs=10):
+        """最近runs次运行中各用例的平均耗时 {nodeid: 秒}，用于按耗时均衡分片"""
+        return {nodeid: statistics.mean(duration for _, duration, _, _ in history)
+                for nodeid, history in self.durations(self.recent_runs(runs)).items()}
+
+    def trend(self, keyword, runs=20):
+        """关键字匹配的用例在最近runs次运行中的耗时：{nodeid: [(run_id, duration, status)]}"""
+        return {nodeid: [(run_id, duration, status) for run_id, duration, status, _ in history]
+                for nodeid, history in self.durations(self.recent_runs(runs), keyword).items()}
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='查询用例运行历史（report/run_history.db）')
+    parser.add_argument('--db', help='运行历史库路径，默认为FILE_PATH["RUN_HISTORY"]')
+    sub = parser.add_subparsers(dest='command', required=True)
+    slowest_parser = sub.add_parser('slowest', help='最近N次运行中平均耗时最长的用例')
+    slowest_parser.add_argument('--runs', type=int, default=10)
+    slowest_parser.add_argument('--limit', type=int, default=20)
+    slowest_parser.add_argument('-k', '--keyword', help='按nodeid或接口名称筛选')
+    regressed_parser = sub.add_parser('regressed', help='最近一次运行相对基线变慢最多的用例')
+    regressed_parser.add_argument('--baseline-runs', type=int, default=5)
+    regressed_parser.add_argument('--min-samples', type=int, default=3)
+    regressed_parser.add_argument('--limit', type=int, default=20)
+    regressed_parser.add_argument('-k', '--keyword', help='按nodeid或接口名称筛选')
+    trend_parser = sub.add_parser('trend', help='用例在最近N次运行中的耗时趋势')
+    trend_parser.add_argument('keyword', help='按nodeid或接口名称筛选')
+    trend_parser.add_argument('--runs', type=int, default=20)
+    export_parser = sub.add_parser('export', help='导出最近N次运行的用例平均耗时JSON，供分片运行的--shard-durations使用')
+    export_parser.add_argument('--runs', type=int, default=10)
+    export_parser.add_argument('-o', '--output', required=True, help='输出的JSON文件路径')
+    args = parser.parse_args(argv)
+
+    history = RunHistory(args.db)
+    if args.command == 'export':
+        durations = history.average_durations(args.runs)
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({nodeid: round(seconds, 4) for nodeid, seconds in sorted(durations.items())},
+                      f, ensure_ascii=False, indent=2)
+        print(f'已导出{len(durations)}条用例的平均耗时：{args.output}')
+        return 0
+    if args.command == 'slowest':
+        table = [['用例', '接口名称', '次数', '平均(ms)', '最大(ms)'], ['', '', '', '', '']]
+        for nodeid, api_name, count, mean, longest in history.slowest(args.runs, args.limit, args.keyword):
+            table.append([nodeid, api_name or '', count, _ms(mean), _ms(longest)])
+    elif args.command == 'regressed':
+        table = [['用例', '接口名称', '基线中位数(ms)', '本次(ms)', '变化'], ['', '', '', '', '']]
+        for nodeid, api_name, median, current, ratio in history.regressed(
+                args.baseline_runs, args.min_samples, args.limit, args.keyword):
+            table.append([nodeid, api_name or '', _ms(median), _ms(current), f'{ratio:+.1%}'])
+    else:
+        table = [['用例', '运行ID', '耗时(ms)', '状态', '趋势'], ['', '', '', '', '']]
+        for nodeid, points in history.trend(args.keyword, args.runs).items():
+            longest = max(duration for _, duration, _ in points) or 1
+            for run_id, duration, status in points:
+                table.append([nodeid, run_id, _ms(duration), status, '#' * max(1, round(duration / longest * 20))])
+            table.append(['', '', '', '', ''])
+    if len(table) == 2:
+        print('没有符合条件的运行历史')
+        return 0
+    if table[-1] != ['', '', '', '', '']:
+        table.append(['', '', '', '', ''])
+    print_table(table)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,72 @@
+import atexit
+import json
+import queue
+import random
 import sys
 
 from conf import setting
 import logging
 import os
 import time
-from logging.handlers import RotatingFileHandler  # 按文件大小滚动备份
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener  # 按文件大小滚动备份；队列异步输出
 import datetime
 
 log_path = setting.FILE_PATH["LOG"]
 if not os.path.exists(log_path):
     os.mkdir(log_path)
-logfile_name = log_path + r"\test.{}.log".format(time.strftime("%Y%m%d"))
+logfile_name = os.path.join(log_path, "test.{}.log".format(time.strftime("%Y%m%d")))
+
+
+class LogBody:
+    """
+    日志参数的延迟格式化：
+    - 记录日志时只保存对象引用，首次格式化日志消息时才做JSON序列化和截断，日志级别未开启时不做任何序列化
+    - 格式化结果会被缓存，文件、控制台和pytest日志捕获等多个handler输出同一条日志时只序列化一次
+    - pytest运行时其日志捕获handler会在用例线程中格式化日志，序列化因此发生在用例线程而不是日志监听线程
+    - value可以是字符串、字节、可JSON序列化的对象，或返回它们的无参函数（如 lambda: resp.text）
+    - 记录日志后不应再修改value
+    """
+    __slots__ = ('value', 'max_chars', 'sampled', '_text')
+
+    def __init__(self, value, max_chars=None, sampled=True):
+        self.value = value
+        self.max_chars = setting.LOG_BODY_MAX_CHARS if max_chars is None else max_chars
+        self.sampled = sampled
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = self._format()
+        return self._text
+
+    def _format(self):
+        if not self.sampled:
+            return "<未采样，不记录内容>"
+        try:
+            value = self.value() if callable(self.value) else self.value
+            if isinstance(value, bytes):
+                value = value.decode('utf-8', errors='replace')
+            text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+        except Exception as e:
+            return f"<日志内容格式化失败：{e}>"
+        if not text:
+            return "<空响应体>"
+        if self.max_chars and len(text) > self.max_chars:
+            return f"{text[:self.max_chars]}...<已截断，共{len(text)}字符>"
+        return text
+
+
+def log_body(value, max_chars=None):
+    """按LOG_BODY_SAMPLE_RATE采样的响应体日志参数，未采样的响应只记录占位文本"""
+    rate = setting.LOG_BODY_SAMPLE_RATE
+    return LogBody(value, max_chars, sampled=rate >= 1 or random.random() < rate)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """只把日志记录放入队列，入队时不格式化消息，文件和控制台输出的格式化由监听线程完成"""
+
+    def prepare(self, record):
+        return record
 
 
 class LogUtil:
@@ -18,6 +74,7 @@ class LogUtil:
 
     def __init__(self):
         self.handle_overdue_log()
+        self.listener = None
 
     def handle_overdue_log(self):
         """处理过期日志文件"""
@@ -31,7 +88,7 @@ class LogUtil:
         files = os.listdir(log_path)
         for file in files:
             if os.path.splitext(file)[1]:
-                filepath = log_path + "\\" + file
+                filepath = os.path.join(log_path, file)
                 file_create_time = os.path.getctime(filepath)  # 获取文件创建时间,返回时间戳
                 # dateArray = datetime.datetime.fromtimestamp(file_createtime) #标准时间格式
                 # print(dateArray.strftime("%Y--%m--%d %H:%M:%S"))
@@ -41,11 +98,14 @@ class LogUtil:
                     continue
 
     def output_logging(self):
-        """获取logger对象"""
+        """
+        获取logger对象
+        logger上只挂QueueHandler，调用方只负责入队；文件和控制台输出由QueueListener后台线程完成，进程退出时停止并刷完队列
+        """
         logger = logging.getLogger(__name__)
         # 防止重复打印日志
         if not logger.handlers:
-            logger.setLevel(setting.LOG_LEVEL)
+            logger.setLevel(min(setting.LOG_LEVEL, setting.STREAM_LOG_LEVEL))
             log_format = logging.Formatter(
                 '%(levelname)s - %(asctime)s - %(filename)s:%(lineno)d -[%(module)s:%(funcName)s] - %(message)s')
             # 日志输出到指定文件，滚动备份日志
@@ -55,16 +115,26 @@ class LogUtil:
 
             fh.setLevel(setting.LOG_LEVEL)
             fh.setFormatter(log_format)
-            # 将相应的handler添加在logger对象中
-            logger.addHandler(fh)
 
             # 输出到控制台
-            sh = logging.StreamHandler()
+            sh = logging.StreamHandler(sys.stderr)
             sh.setLevel(setting.STREAM_LOG_LEVEL)
             sh.setFormatter(log_format)
-            logger.addHandler(sh)
+
+            # 将队列handler添加在logger对象中，文件和控制台handler由监听线程调用
+            log_queue = queue.SimpleQueue()
+            logger.addHandler(_DeferredQueueHandler(log_queue))
+            self.listener = QueueListener(log_queue, fh, sh, respect_handler_level=True)
+            self.listener.start()
+            atexit.register(self.stop)
         return logger
 
+    def stop(self):
+        """停止监听线程，输出队列中剩余的日志"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
 
 apilog = LogUtil()
 logs = apilog.output_logging()
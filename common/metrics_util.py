@@ -0,0 +1,249 @@
+import json
+import os
+import threading
+import time
+
+# 直方图每个2的幂区间划分的子桶位数：7位即64~128个子桶，相对误差不超过1/64
+_SUB_BUCKET_BITS = 7
+
+
+class RequestTiming:
+    """
+    一次请求的耗时和流量，由SendRequest.send_request采集并挂在响应的timing属性上
+    - total：发送请求到读完响应体的总耗时（秒）
+    - ttfb：发送请求到收到响应头的耗时（秒）
+    - bytes_in/bytes_out：响应体/请求体字节数
+    - retries：连接池自动重试的次数
+    """
+    __slots__ = ('total', 'ttfb', 'bytes_in', 'bytes_out', 'retries')
+
+    def __init__(self, total, ttfb=None, bytes_in=0, bytes_out=0, retries=0):
+        self.total = total
+        self.ttfb = total if ttfb is None else ttfb
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
+        self.retries = retries
+
+    def __repr__(self):
+        return (f'RequestTiming(total={self.total:.4f}, ttfb={self.ttfb:.4f}, bytes_in={self.bytes_in}, '
+                f'bytes_out={self.bytes_out}, retries={self.retries})')
+
+
+def body_size(body):
+    """请求体字节数，流式请求体（生成器、文件）无法预先得知大小时返回0"""
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    return 0
+
+
+class LatencyHistogram:
+    """
+    对数线性分桶的耗时直方图（HDR风格），单位微秒：
+    - 小于128us的值精确计数，更大的值按所在2的幂区间划分64个子桶，百分位相对误差不超过1.6%
+    - 以子桶下界为key计数，同一接口不论请求多少次只占用几十到几百个桶，可序列化为JSON并与其他直方图合并
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def _bucket_of(value):
+        shift = max(0, value.bit_length() - _SUB_BUCKET_BITS)
+        return (value >> shift) << shift
+
+    @staticmethod
+    def _bucket_upper(lower):
+        return lower + (1 << max(0, lower.bit_length() - _SUB_BUCKET_BITS)) - 1
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1000000))
+        bucket = self._bucket_of(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def percentile(self, percent):
+        """返回百分位耗时（微秒），取所在子桶的上界且不超过最大值"""
+        if not self.count:
+            return 0
+        rank = max(1, -(-self.count * percent // 100))
+        seen = 0
+        for lower in sorted(self.buckets):
+            seen += self.buckets[lower]
+            if seen >= rank:
+                return min(self._bucket_upper(lower), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def merge(self, other):
+        for lower, count in other.buckets.items():
+            self.buckets[lower] = self.buckets.get(lower, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def to_dict(self):
+        return {'count': self.count, 'total': self.total, 'min': self.min, 'max': self.max,
+                'buckets': {str(lower): count for lower, count in sorted(self.buckets.items())}}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.buckets = {int(lower): count for lower, count in (data.get('buckets') or {}).items()}
+        histogram.count = data.get('count', 0)
+        histogram.total = data.get('total', 0)
+        histogram.min = data.get('min')
+        histogram.max = data.get('max', 0)
+        return histogram
+
+
+class ApiMetrics:
+    """单个接口（api_name）的耗时直方图、流量和重试次数"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.ttfb = LatencyHistogram()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.retries = 0
+
+    def record(self, timing):
+        self.latency.record(timing.total)
+        self.ttfb.record(timing.ttfb)
+        self.bytes_in += timing.bytes_in
+        self.bytes_out += timing.bytes_out
+        self.retries += timing.retries
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.ttfb.merge(other.ttfb)
+        self.bytes_in += other.bytes_in
+        self.bytes_out += other.bytes_out
+        self.retries += other.retries
+
+    def summary(self):
+        """常用统计值，耗时单位为毫秒"""
+        latency = self.latency
+        return {
+            'count': latency.count,
+            'mean_ms': round(latency.mean / 1000, 2),
+            'p50_ms': round(latency.percentile(50) / 1000, 2),
+            'p90_ms': round(latency.percentile(90) / 1000, 2),
+            'p99_ms': round(latency.percentile(99) / 1000, 2),
+            'max_ms': round(latency.max / 1000, 2),
+            'ttfb_p90_ms': round(self.ttfb.percentile(90) / 1000, 2),
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'retries': self.retries,
+        }
+
+    def to_dict(self):
+        return {'summary': self.summary(), 'latency': self.latency.to_dict(), 'ttfb': self.ttfb.to_dict(),
+                'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out, 'retries': self.retries}
+
+    @classmethod
+    def from_dict(cls, data):
+        metrics = cls()
+        metrics.latency = LatencyHistogram.from_dict(data.get('latency') or {})
+        metrics.ttfb = LatencyHistogram.from_dict(data.get('ttfb') or {})
+        metrics.bytes_in = data.get('bytes_in', 0)
+        metrics.bytes_out = data.get('bytes_out', 0)
+        metrics.retries = data.get('retries', 0)
+        return metrics
+
+
+def _format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+        size /= 1024
+    return f'{size:.1f}GB'
+
+
+class MetricsCollector:
+    """
+    按api_name汇总本次运行的接口耗时，线程安全
+    pytest-xdist运行时各worker在会话结束时通过workeroutput上报，由主进程merge后统一输出
+    """
+
+    def __init__(self):
+        self.apis = {}
+        self._lock = threading.Lock()
+        self._case_requests = None
+
+    def start_case(self):
+        """开始记录当前用例的接口请求，由运行历史在用例call阶段开始时调用"""
+        self._case_requests = []
+
+    def pop_case(self):
+        """返回start_case之后的接口请求 [(api_name, url, RequestTiming)] 并停止记录"""
+        requests, self._case_requests = self._case_requests or [], None
+        return requests
+
+    def record(self, api_name, timing, url=None):
+        if self._case_requests is not None:
+            self._case_requests.append((api_name, url, timing))
+        if timing is None:
+            return
+        with self._lock:
+            metrics = self.apis.get(api_name)
+            if metrics is None:
+                metrics = self.apis[api_name] = ApiMetrics()
+            metrics.record(timing)
+
+    def merge(self, data):
+        """合并to_dict()导出的数据，用于汇总xdist各worker的结果"""
+        with self._lock:
+            for api_name, api_data in ((data or {}).get('apis') or {}).items():
+                metrics = self.apis.get(api_name)
+                if metrics is None:
+                    metrics = self.apis[api_name] = ApiMetrics()
+                metrics.merge(ApiMetrics.from_dict(api_data))
+
+    def to_dict(self):
+        with self._lock:
+            return {'generated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'apis': {api_name: metrics.to_dict() for api_name, metrics in self.apis.items()}}
+
+    @classmethod
+    def load(cls, path):
+        """读取dump写出的JSON文件"""
+        collector = cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            collector.merge(json.load(f))
+        return collector
+
+    def dump(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def summary_lines(self):
+        """每个接口一行的耗时摘要，按p90从高到低排列，用于控制台摘要和邮件正文"""
+        lines = []
+        summaries = sorted(((name, metrics.summary()) for name, metrics in self.apis.items()),
+                           key=lambda item: item[1]['p90_ms'], reverse=True)
+        for api_name, s in summaries:
+            lines.append(f"接口[{api_name}]：请求{s['count']}次，p50 {s['p50_ms']}ms，p90 {s['p90_ms']}ms，"
+                         f"p99 {s['p99_ms']}ms，最大 {s['max_ms']}ms，接收{_format_bytes(s['bytes_in'])}，"
+                         f"发送{_format_bytes(s['bytes_out'])}，重试{s['retries']}次")
+        return lines
+
+
+# 进程级的接口耗时统计，由SendRequest和异步执行引擎写入
+api_metrics = MetricsCollector()
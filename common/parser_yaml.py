@@ -1,12 +1,18 @@
+import hashlib
+import os
+import pickle
 import yaml
 import traceback
-import os
-from copy import deepcopy
 
+from common.extract_store import extract_store
+from common.extractor import compile_extract
 from common.log_util import logs
 from conf.config_util import OperationConfig
 from conf.setting import FILE_PATH
 
+# 优先使用libyaml的C加载器，未安装时回退到纯Python实现
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 try:
     _REQUEST_METHOD_CANDIDATES = OperationConfig().get_request_methods()
 except Exception:
@@ -15,9 +21,11 @@ except Exception:
 
 
 def _expand_missing_field_cases(test_case):
-    """根据missing_fields配置生成多条缺失字段的用例"""
+    """根据missing_fields配置生成多条缺失字段的用例
+    变体之间只复制顶层dict和被修改的请求参数dict，其余嵌套数据共享（执行用例时不会修改原始数据）
+    """
 
-    case_copy = deepcopy(test_case)
+    case_copy = dict(test_case)
     missing_fields = case_copy.pop('missing_fields', None)
     if not missing_fields:
         return [case_copy]
@@ -48,7 +56,7 @@ def _expand_missing_field_cases(test_case):
             logs.error('missing_fields配置中缺少field，请检查yaml文件！')
             continue
 
-        variant = deepcopy(case_copy)
+        variant = dict(case_copy)
         case_name = variant.get('case_name', '')
         field_label = str(label or field_name)
         if '{field}' in case_name:
@@ -66,7 +74,7 @@ def _expand_missing_field_cases(test_case):
         if payload_key is None:
             payload_key = 'data'
 
-        payload_data = deepcopy(variant.get(payload_key, {})) if isinstance(variant.get(payload_key), dict) else {}
+        payload_data = dict(variant[payload_key]) if isinstance(variant.get(payload_key), dict) else {}
 
         if mode == 'empty':
             payload_data[field_name] = '' if value is None else value
@@ -86,7 +94,7 @@ def _expand_missing_field_cases(test_case):
 def _expand_method_cases(test_case):
     """根据support字段自动生成不支持请求方式的用例"""
 
-    case_copy = deepcopy(test_case)
+    case_copy = dict(test_case)
     support_value = case_copy.pop('support', None)
     if support_value is None:
         return [case_copy]
@@ -107,7 +115,7 @@ def _expand_method_cases(test_case):
     base_name = case_copy.get('case_name', '')
 
     for method in unsupported_methods:
-        variant = deepcopy(case_copy)
+        variant = dict(case_copy)
         variant.pop('extract', None)
         variant.pop('extract_list', None)
         variant['method'] = method
@@ -115,7 +123,7 @@ def _expand_method_cases(test_case):
             for payload_key in ('json', 'data'):
                 payload_value = variant.get(payload_key)
                 if isinstance(payload_value, dict):
-                    variant['params'] = deepcopy(payload_value)
+                    variant['params'] = dict(payload_value)
                     variant.pop(payload_key, None)
                     break
         label = f"{base_name}-不支持的请求方式[{method}]" if base_name else f"不支持的请求方式[{method}]"
@@ -126,38 +134,131 @@ def _expand_method_cases(test_case):
     return results
 
 
+# 用例收集缓存：yaml文件绝对路径 -> 缓存条目
+_COLLECTION_CACHE = {}
+# 磁盘缓存的格式版本，修改用例展开逻辑或缓存条目结构时递增，旧版本的缓存文件不再命中
+_CASE_CACHE_VERSION = 2
+
+# 用例数据 -> 来源yaml文件，供依赖调度按文件分组使用；同时保存对象引用，避免id被复用
+_CASE_SOURCES = {}
+
+
+def _register_source(case, file):
+    _CASE_SOURCES[id(case)] = (case, os.path.abspath(file))
+
+
+def testcase_source(case):
+    """返回由get_testcase_yaml生成的用例数据所属的yaml文件绝对路径，未知时返回None"""
+    entry = _CASE_SOURCES.get(id(case))
+    if entry is not None and entry[0] is case:
+        return entry[1]
+    return None
+
+
+def _load_testcase_yaml(file):
+    """解析yaml用例文件并展开缺失字段、不支持请求方式的用例"""
+    with open(file, 'r', encoding='utf-8') as f:
+        data = yaml.load(f, Loader=_YAML_LOADER)
+    if not data:
+        return []
+
+    if len(data) <= 1:
+        testcase_list = []
+        yam_data = data[0]
+        # 同一文件的用例共享baseInfo，执行用例时不会修改baseInfo
+        base_info = yam_data.get('baseInfo', {})
+        for ts in yam_data.get('testCase', []):
+            for expanded in _expand_missing_field_cases(ts):
+                for case_variant in _expand_method_cases(expanded):
+                    testcase_list.append([base_info, case_variant])
+        return testcase_list
+
+    result = []
+    for block in data:
+        base_info = block.get('baseInfo', {})
+        cases = []
+        for ts in block.get('testCase', []):
+            for expanded in _expand_missing_field_cases(ts):
+                cases.extend(_expand_method_cases(expanded))
+        result.append({'baseInfo': base_info, 'testCase': cases})
+    return result
+
+
+def _cache_file(path):
+    key = f'{_CASE_CACHE_VERSION}:{path}'
+    return os.path.join(FILE_PATH['CASE_CACHE'], hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pkl')
+
+
+def _read_cache(path):
+    try:
+        with open(_cache_file(path), 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return None
+
+
+def _write_cache(path, entry):
+    try:
+        os.makedirs(FILE_PATH['CASE_CACHE'], exist_ok=True)
+        cache_file = _cache_file(path)
+        tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'wb') as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except Exception:
+        logs.error(f'写入用例收集缓存失败：{traceback.format_exc()}')
+
+
+def _collect_testcase_yaml(file):
+    """
+    带缓存的用例收集：
+    - 进程内和磁盘（FILE_PATH['CASE_CACHE']）两级缓存展开后的用例列表
+    - 文件路径、mtime、大小与REQUEST_METHODS配置一致时直接命中；mtime变化时再比较内容hash，内容未变也视为命中
+    - 只有内容或配置发生变化的文件才重新解析展开
+    """
+    path = os.path.abspath(file)
+    stat = os.stat(path)
+    methods = tuple(_REQUEST_METHOD_CANDIDATES)
+
+    entry = _COLLECTION_CACHE.get(path)
+    if entry is None:
+        entry = _read_cache(path)
+    if entry and entry['methods'] == methods and (entry['mtime_ns'], entry['size']) == (stat.st_mtime_ns, stat.st_size):
+        _COLLECTION_CACHE[path] = entry
+        return entry['result']
+
+    with open(path, 'rb') as f:
+        content_hash = hashlib.sha1(f.read()).hexdigest()
+    if not (entry and entry['methods'] == methods and entry['content_hash'] == content_hash):
+        entry = {'methods': methods, 'content_hash': content_hash, 'result': _load_testcase_yaml(file)}
+    entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+    _COLLECTION_CACHE[path] = entry
+    _write_cache(path, entry)
+    return entry['result']
+
+
+def _precompile_extract(test_cases):
+    """收集用例时预编译extract/extract_list提取规则，执行用例时直接复用"""
+    for test_case in test_cases:
+        if test_case.get('extract') or test_case.get('extract_list'):
+            compile_extract(test_case.get('extract'), test_case.get('extract_list'))
+
+
 def get_testcase_yaml(file):
     testcase_list = []
     try:
-        with open(file, 'r', encoding='utf-8') as f:
-            data = yaml.safe_load(f)
-            if not data:
-                return testcase_list
-
-            if len(data) <= 1:
-                yam_data = data[0]
-                base_info = deepcopy(yam_data.get('baseInfo', {}))
-                for ts in yam_data.get('testCase', []):
-                    for expanded in _expand_missing_field_cases(ts):
-                        for case_variant in _expand_method_cases(expanded):
-                            testcase_list.append([deepcopy(base_info), case_variant])
-                return testcase_list
-
-            result = []
-            for block in data:
-                base_info = deepcopy(block.get('baseInfo', {}))
-                cases = []
-                for ts in block.get('testCase', []):
-                    for expanded in _expand_missing_field_cases(ts):
-                        cases.extend(_expand_method_cases(expanded))
-                result.append({'baseInfo': base_info, 'testCase': cases})
-            return result
+        result = _collect_testcase_yaml(file)
+        for case in result:
+            _register_source(case[1] if isinstance(case, list) else case, file)
+            _precompile_extract([case[1]] if isinstance(case, list) else case['testCase'])
+        return result
     except UnicodeDecodeError:
         logs.error(f"[{file}]文件编码格式错误，--尝试使用utf-8编码解码YAML文件时发生了错误，请确保你的yaml文件是UTF-8格式！")
     except FileNotFoundError:
         logs.error(f'[{file}]文件未找到，请检查路径是否正确')
     except Exception as e:
         logs.error(f'获取【{file}】文件数据时出现未知错误: {str(e)}')
+    return testcase_list
 
 
 class YmalParser:
@@ -188,57 +289,37 @@ class YmalParser:
 
     def write_yaml_data(self, value):
         """
-        写入数据需为dict，allow_unicode=True表示写入中文，sort_keys按顺序写入
-        写入YAML文件数据,主要用于接口关联
+        写入接口关联数据，主要用于接口关联
+        数据写入进程内的extract存储，同名key覆盖旧值，在检查点统一落盘到extract.yaml
         :param value: 写入数据，必须用dict
         :return:
         """
-
-        file = None
-        file_path = FILE_PATH['EXTRACT']
-        if not os.path.exists(file_path):
-            os.system(file_path)
-        try:
-            file = open(file_path, 'a', encoding='utf-8')
-            if isinstance(value, dict):
-                write_data = yaml.dump(value, allow_unicode=True, sort_keys=False)
-                file.write(write_data)
-            else:
-                logs.info('写入[extract.yaml]的数据必须为dict格式')
-        except Exception:
-            logs.error(str(traceback.format_exc()))
-        finally:
-            file.close()
+        if isinstance(value, dict):
+            extract_store.update(value)
+        else:
+            logs.info('写入[extract.yaml]的数据必须为dict格式')
 
     def clear_yaml_data(self):
         """
         清空extract.yaml文件数据
-        :param filename: yaml文件名
         :return:
         """
-        with open(FILE_PATH['EXTRACT'], 'w') as f:
-            f.truncate()
+        extract_store.clear()
 
     def get_extract_yaml(self, node_name, second_node_name=None):
         """
-        用于读取接口提取的变量值
+        用于读取接口提取的变量值，直接从内存索引读取，不再解析extract.yaml
         :param node_name:
         :return:
         """
-        if os.path.exists(FILE_PATH['EXTRACT']):
-            pass
-        else:
-            logs.error('extract.yaml不存在')
-            file = open(FILE_PATH['EXTRACT'], 'w')
-            file.close()
-            logs.info('extract.yaml创建成功！')
         try:
-            with open(FILE_PATH['EXTRACT'], 'r', encoding='utf-8') as rf:
-                ext_data = yaml.safe_load(rf)
-                if second_node_name is None:
-                    return ext_data[node_name]
-                else:
-                    return ext_data[node_name][second_node_name]
+            if node_name not in extract_store:
+                raise KeyError(node_name)
+            ext_data = extract_store.get(node_name)
+            if second_node_name is None:
+                return ext_data
+            else:
+                return ext_data[second_node_name]
         except Exception as e:
             logs.error(f"【extract.yaml】没有找到：{node_name},--%s" % e)
 
@@ -0,0 +1,142 @@
+import argparse
+import os
+import shutil
+import sys
+
+from common.metrics_util import MetricsCollector
+from common.two_dimension_data import print_table
+from conf.config_util import OperationConfig
+from conf.setting import FILE_PATH
+
+# 对比结论
+REGRESSED = '变慢'
+IMPROVED = '变快'
+PASSED = '通过'
+TOO_FEW_SAMPLES = '样本不足'
+NEW_API = '新增接口'
+MISSING_API = '本次未请求'
+
+
+class ApiComparison:
+    """单个接口本次与基线的耗时百分位对比，耗时单位为毫秒"""
+    __slots__ = ('api_name', 'baseline_count', 'current_count', 'baseline_ms', 'current_ms', 'status')
+
+    def __init__(self, api_name, baseline_count, current_count, baseline_ms, current_ms, status):
+        self.api_name = api_name
+        self.baseline_count = baseline_count
+        self.current_count = current_count
+        self.baseline_ms = baseline_ms
+        self.current_ms = current_ms
+        self.status = status
+
+    @property
+    def change(self):
+        """相对基线的变化比例，任一方缺失或基线为0时返回None"""
+        if self.baseline_ms is None or self.current_ms is None or not self.baseline_ms:
+            return None
+        return (self.current_ms - self.baseline_ms) / self.baseline_ms
+
+
+def compare(current, baseline, percentile=90, max_regression=0.2, min_samples=5, min_delta_ms=5.0):
+    """
+    按api_name对比两次运行的耗时百分位：
+    - 本次和基线的请求次数都不少于min_samples时才判定，否则记为样本不足
+    - 变慢比例超过max_regression且变慢毫秒数超过min_delta_ms时记为变慢，两个条件同时满足才判定，
+      避免毫秒级接口的比例抖动和高耗时接口的小幅波动误报
+    :param current: 本次运行的MetricsCollector
+    :param baseline: 基线的MetricsCollector
+    :return: [ApiComparison]，变慢的接口排在最前，其余按变化比例从大到小排列
+    """
+    rows = []
+    for api_name in sorted(set(current.apis) | set(baseline.apis)):
+        current_metrics, baseline_metrics = current.apis.get(api_name), baseline.apis.get(api_name)
+        current_count = current_metrics.latency.count if current_metrics else 0
+        baseline_count = baseline_metrics.latency.count if baseline_metrics else 0
+        current_ms = current_metrics.latency.percentile(percentile) / 1000 if current_metrics else None
+        baseline_ms = baseline_metrics.latency.percentile(percentile) / 1000 if baseline_metrics else None
+        if baseline_metrics is None:
+            status = NEW_API
+        elif current_metrics is None:
+            status = MISSING_API
+        elif current_count < min_samples or baseline_count < min_samples:
+            status = TOO_FEW_SAMPLES
+        elif (current_ms - baseline_ms > min_delta_ms
+              and current_ms > baseline_ms * (1 + max_regression)):
+            status = REGRESSED
+        elif (baseline_ms - current_ms > min_delta_ms
+              and current_ms < baseline_ms * (1 - max_regression)):
+            status = IMPROVED
+        else:
+            status = PASSED
+        rows.append(ApiComparison(api_name, baseline_count, current_count, baseline_ms, current_ms, status))
+    return sorted(rows, key=lambda row: (row.status != REGRESSED,
+                                         -(row.change if row.change is not None else float('-inf'))))
+
+
+def comparison_table(rows, percentile):
+    """对比结果表格，格式同print_table的入参"""
+    label = f'p{percentile:g}'
+    blank = [''] * 7
+    table = [['接口名称', '基线次数', '本次次数', f'基线{label}(ms)', f'本次{label}(ms)', '变化', '结论'], blank]
+    for row in rows:
+        change = row.change
+        table.append([row.api_name, row.baseline_count, row.current_count,
+                      '' if row.baseline_ms is None else round(row.baseline_ms, 2),
+                      '' if row.current_ms is None else round(row.current_ms, 2),
+                      '' if change is None else f'{change:+.1%}', row.status])
+    table.append(blank)
+    return table
+
+
+def main(argv=None):
+    gate = OperationConfig().get_perf_gate()
+    parser = argparse.ArgumentParser(description='接口性能回归门禁：按api_name对比本次运行与基线的耗时百分位，默认阈值取自config.ini的[PERF_GATE]')
+    sub = parser.add_subparsers(dest='command', required=True)
+    compare_parser = sub.add_parser('compare', help='对比本次运行与基线，有接口变慢时退出码为1')
+    compare_parser.add_argument('--current', default=FILE_PATH['API_METRICS'], help='本次运行的api_metrics.json')
+    compare_parser.add_argument('--baseline', default=FILE_PATH['PERF_BASELINE'],
+                                help='基线，可以是固定的基线文件或上一次运行的api_metrics.json')
+    compare_parser.add_argument('--percentile', type=float, default=gate['percentile'], help='对比的耗时百分位')
+    compare_parser.add_argument('--max-regression', type=float, default=gate['max_regression'],
+                                help='允许的最大变慢比例，0.2即20%%')
+    compare_parser.add_argument('--min-samples', type=int, default=gate['min_samples'], help='本次和基线各自的最少请求次数')
+    compare_parser.add_argument('--min-delta-ms', type=float, default=gate['min_delta_ms'], help='最小变慢毫秒数')
+    compare_parser.add_argument('--allow-missing-baseline', action='store_true',
+                                help='基线不存在时跳过对比并返回0，默认返回2，避免基线路径错误或丢失时门禁被静默放行')
+    save_parser = sub.add_parser('save', help='把本次运行的api_metrics.json保存为基线')
+    save_parser.add_argument('--current', default=FILE_PATH['API_METRICS'], help='本次运行的api_metrics.json')
+    save_parser.add_argument('--baseline', default=FILE_PATH['PERF_BASELINE'], help='基线文件路径')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.current):
+        print(f'未找到本次运行的接口耗时统计：{args.current}，请先执行用例')
+        return 2
+    if args.command == 'save':
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        shutil.copy(args.current, args.baseline)
+        print(f'已保存基线：{args.baseline}')
+        return 0
+    if not os.path.exists(args.baseline):
+        if args.allow_missing_baseline:
+            print(f'未找到基线：{args.baseline}，跳过对比，可执行 python -m common.perf_gate save 保存基线')
+            return 0
+        print(f'未找到基线：{args.baseline}，请检查--baseline路径，或执行 python -m common.perf_gate save 保存基线')
+        return 2
+
+    rows = compare(MetricsCollector.load(args.current), MetricsCollector.load(args.baseline), args.percentile,
+                   args.max_regression, args.min_samples, args.min_delta_ms)
+    if not rows:
+        print('本次运行和基线都没有接口耗时数据')
+        return 0
+    print_table(comparison_table(rows, args.percentile))
+    regressed = [row.api_name for row in rows if row.status == REGRESSED]
+    if regressed:
+        print(f'性能回归：{len(regressed)}个接口的p{args.percentile:g}耗时变慢超过{args.max_regression:.0%}'
+              f'且超过{args.min_delta_ms:g}ms：{"、".join(regressed)}')
+        return 1
+    print(f'未发现性能回归（p{args.percentile:g}阈值{args.max_regression:.0%}，最少样本{args.min_samples}次）')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,25 +1,158 @@
 # -*- coding: utf-8 -*-
-import json
+import atexit
+import threading
 import time
 import requests
 import pytest
 import allure
 
+from http.cookiejar import DefaultCookiePolicy
 from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
 
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 from conf import setting
-from common.log_util import logs
+from conf.config_util import OperationConfig
+from common.attach_util import attach
+from common.log_util import LogBody, log_body, logs
+from common.metrics_util import RequestTiming, api_metrics, body_size
 from common.parser_yaml import YmalParser
+from common.response_util import ResponseWrapper, wrap_response
+
+
+class _RejectCookiePolicy(DefaultCookiePolicy):
+    """共享 Session 不保存任何 Cookie，避免用例之间通过会话串号；Cookie 仍由 extract.yaml 显式关联"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+
+class SessionPool:
+    """
+    进程级 Session 注册表：
+    - 按接口 host（scheme://host:port）共享 requests.Session，跨用例复用 TCP/TLS 连接
+    - 连接池大小、keep-alive 取自 config.ini 的 [HTTP_POOL]
+    - 线程安全，stats() 返回每个 host 的请求数、新建连接数和复用次数
+    """
+
+    # 连接池用满时不阻塞等待，超出的连接用完即关（与 HTTPAdapter 默认一致），调整连接池大小时沿用
+    pool_block = False
+
+    def __init__(self, pool_conf: Optional[Dict[str, Any]] = None):
+        self._pool_conf = pool_conf
+        self._sessions: Dict[tuple, requests.Session] = {}
+        self._lock = threading.Lock()
+        # 不在当前连接池中的计数（调整连接池大小时被替换的连接池、xdist worker上报的统计），按 host 累加到 stats() 中
+        self._retired_counts: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def pool_conf(self) -> Dict[str, Any]:
+        if self._pool_conf is None:
+            self._pool_conf = OperationConfig().get_http_pool()
+        return self._pool_conf
+
+    @staticmethod
+    def origin_of(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def get(self, url: str, **retry_options: Any) -> requests.Session:
+        """获取 url 对应 host 的共享 Session，不存在则按重试策略创建"""
+        key = (self.origin_of(url), tuple(sorted(retry_options.items())))
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = SendRequest._build_session(
+                    pool_connections=self.pool_conf['pool_connections'],
+                    pool_maxsize=self.pool_conf['pool_maxsize'],
+                    pool_block=self.pool_block,
+                    **retry_options,
+                )
+                session.cookies.set_policy(_RejectCookiePolicy())
+                if not self.pool_conf['keep_alive']:
+                    session.headers['Connection'] = 'close'
+                self._sessions[key] = session
+                logs.info("创建共享Session：%s，连接池大小：%s", key[0], self.pool_conf['pool_maxsize'])
+        return session
+
+    def ensure_pool_maxsize(self, pool_maxsize: int) -> None:
+        """
+        把连接池大小提高到至少 pool_maxsize（如压测的虚拟用户数），不大于当前大小时不做任何调整
+        已创建的 Session 重建适配器的连接池，否则超出原大小的并发连接用完即被丢弃
+        """
+        with self._lock:
+            if pool_maxsize <= self.pool_conf['pool_maxsize']:
+                return
+            self.pool_conf['pool_maxsize'] = pool_maxsize
+            for (origin, _), session in self._sessions.items():
+                # 旧连接池关闭前保留其计数，连接池摘要中的请求数和新建连接数不因调整而清零
+                retired = self._retired_counts.setdefault(origin, {'requests': 0, 'opened': 0})
+                self._add_pool_counts(retired, session)
+                for adapter in set(session.adapters.values()):
+                    if not isinstance(adapter, HTTPAdapter):
+                        continue
+                    adapter.poolmanager.clear()
+                    adapter.init_poolmanager(self.pool_conf['pool_connections'], pool_maxsize,
+                                             block=self.pool_block)
+                logs.info("调整共享Session连接池大小：%s，连接池大小：%s", origin, pool_maxsize)
+
+    @staticmethod
+    def _add_pool_counts(counts: Dict[str, int], session: requests.Session) -> None:
+        """把 Session 当前各连接池的请求数、新建连接数累加到 counts"""
+        for adapter in set(session.adapters.values()):
+            pool_manager = getattr(adapter, 'poolmanager', None)
+            if pool_manager is None:
+                continue
+            for pool_key in list(pool_manager.pools.keys()):
+                pool = pool_manager.pools.get(pool_key)
+                if pool is None:
+                    continue
+                counts['requests'] += getattr(pool, 'num_requests', 0)
+                counts['opened'] += getattr(pool, 'num_connections', 0)
+
+    def merge_stats(self, stats: Optional[Dict[str, Dict[str, int]]]) -> None:
+        """合并 stats() 导出的统计，用于汇总 xdist 各 worker 的连接池计数"""
+        with self._lock:
+            for origin, host_stats in (stats or {}).items():
+                counts = self._retired_counts.setdefault(origin, {'requests': 0, 'opened': 0})
+                counts['requests'] += host_stats.get('requests', 0)
+                counts['opened'] += host_stats.get('opened', 0)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """按 host 汇总 urllib3 连接池计数：requests 为发出的请求数，opened 为新建连接数"""
+        result: Dict[str, Dict[str, int]] = {}
+        with self._lock:
+            sessions = list(self._sessions.items())
+            for origin, retired in self._retired_counts.items():
+                result[origin] = {'requests': retired['requests'], 'opened': retired['opened'], 'reused': 0}
+        for (origin, _), session in sessions:
+            host_stats = result.setdefault(origin, {'requests': 0, 'opened': 0, 'reused': 0})
+            self._add_pool_counts(host_stats, session)
+        for host_stats in result.values():
+            host_stats['reused'] = max(0, host_stats['requests'] - host_stats['opened'])
+        return result
+
+    def close_all(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                try:
+                    session.close()
+                except Exception:
+                    pass
+            self._sessions.clear()
+            self._retired_counts.clear()
 
 
 class SendRequest:
     """
     统一的请求发送封装：
     - 仅暴露 run_main() 和 send_request() 两个入口
-    - 统一返回 requests.Response（不再混用自定义字典返回）
+    - 统一返回包装了 requests.Response 的 ResponseWrapper，响应体只解析一次
     - 集中处理：日志、Allure 附件、超时、SSL、重试、文件上传、Cookie 落盘、异常转换
     - 与旧代码兼容：run_main(...) 仍然接收参数名 file（会映射到 requests 的 files）
     """
@@ -35,8 +168,8 @@ class SendRequest:
         self.cookie = cookie or {}
         self.read = YmalParser()
 
-        # 预置 Session + 重试策略（对 GET/POST/PUT/DELETE…通用）
-        self.session = self._build_session(
+        # 重试策略（对 GET/POST/PUT/DELETE…通用），Session 按 host 从 session_pool 共享获取
+        self._retry_options = dict(
             retries=retries,
             backoff_factor=backoff_factor,
             status_forcelist=status_forcelist,
@@ -49,8 +182,11 @@ class SendRequest:
         backoff_factor: float,
         status_forcelist: Optional[tuple],
         respect_retry_after_header: bool,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
     ) -> requests.Session:
-        """构建带重试的 Session"""
+        """构建带重试和连接池的 Session"""
         session = requests.Session()
         retry = Retry(
             total=retries,
@@ -62,7 +198,8 @@ class SendRequest:
             allowed_methods=False,  # 对所有方法生效（urllib3>=1.26 可用 set；False 表示不过滤）
             respect_retry_after_header=respect_retry_after_header,
         )
-        adapter = HTTPAdapter(max_retries=retry)
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                              pool_block=pool_block)
         session.mount("http://", adapter)
         session.mount("https://", adapter)
         return session
@@ -76,7 +213,7 @@ class SendRequest:
         files: Optional[Dict[str, Any]],
         kwargs: Dict[str, Any],
     ) -> None:
-        """把请求关键要素写到 Allure 报告"""
+        """把请求关键要素写到 Allure 报告，序列化和写文件由后台线程完成"""
         try:
             payload = {
                 "method": method,
@@ -86,8 +223,8 @@ class SendRequest:
                 "files": list(files.keys()) if isinstance(files, dict) else None,
                 "kwargs": kwargs,  # 可能包含 data/json/params 等
             }
-            allure.attach(
-                json.dumps(payload, ensure_ascii=False, indent=2),
+            attach(
+                payload,
                 name="请求详情",
                 attachment_type=allure.attachment_type.JSON,
             )
@@ -95,27 +232,57 @@ class SendRequest:
             # 附件失败不影响主流程
             pass
 
+    @staticmethod
+    def _attach_params_to_allure(params: Dict[str, Any]) -> None:
+        """统一把请求参数作为一个 JSON 附件，同步与异步执行共用"""
+        try:
+            if params:
+                attach(
+                    params,
+                    name="请求参数",
+                    attachment_type=allure.attachment_type.JSON,
+                )
+        except Exception:
+            pass
+
     @staticmethod
     def _attach_response_to_allure(resp: requests.Response) -> None:
-        """把响应写到 Allure 报告"""
+        """把响应写到 Allure 报告，复用 ResponseWrapper 已解析的响应体"""
         try:
+            resp = wrap_response(resp)
             # Body（优先 JSON 美化）
             try:
                 body = resp.json()
-                allure.attach(
-                    json.dumps(body, ensure_ascii=False, indent=2),
+                attach(
+                    body,
                     name="响应体(JSON)",
                     attachment_type=allure.attachment_type.JSON,
                 )
             except Exception:
-                allure.attach(
-                    resp.text or "",
+                attach(
+                    lambda: resp.text or "",
                     name="响应体(原文)",
                     attachment_type=allure.attachment_type.TEXT,
                 )
         except Exception:
             pass
 
+    @staticmethod
+    def _timing_of(resp: ResponseWrapper, total: float) -> Optional[RequestTiming]:
+        """由requests响应整理耗时和流量：elapsed为收到响应头的耗时，重试次数取自urllib3的Retry历史"""
+        try:
+            raw = resp.raw
+            retry = getattr(getattr(raw, "raw", None), "retries", None)
+            return RequestTiming(
+                total=total,
+                ttfb=raw.elapsed.total_seconds() if raw.elapsed else total,
+                bytes_in=len(raw.content or b""),
+                bytes_out=body_size(getattr(raw.request, "body", None)),
+                retries=len(getattr(retry, "history", None) or ()),
+            )
+        except Exception:
+            return None
+
     @staticmethod
     def _close_files(files: Optional[Dict[str, Any]]) -> None:
         """
@@ -149,10 +316,10 @@ class SendRequest:
         verify: bool = False,
         allow_redirects: bool = True,
         **kwargs: Any,
-    ) -> requests.Response:
+    ) -> ResponseWrapper:
         """
         直接发送请求
-        :return: requests.Response
+        :return: ResponseWrapper
         """
 
         # 设置超时时间，默认30秒
@@ -165,14 +332,16 @@ class SendRequest:
             logs.info("请求头：%s", headers)
             logs.info("Cookie：%s", cookies)
             if kwargs:
-                logs.info("请求参数：%s", json.dumps(kwargs, ensure_ascii=False))
+                logs.info("请求参数：%s", LogBody(kwargs))
             self._attach_request_to_allure(method, url, headers, cookies, files, kwargs)
         except Exception:
             pass
 
         start_ts = time.time()
         try:
-            resp = self.session.request(
+            session = session_pool.get(url, **self._retry_options)
+            request_start = time.perf_counter()
+            resp = wrap_response(session.request(
                 method=method,
                 url=url,
                 headers=headers,
@@ -182,7 +351,8 @@ class SendRequest:
                 verify=verify,
                 allow_redirects=allow_redirects,
                 **kwargs,  # data/json/params 等
-            )
+            ))
+            resp.timing = self._timing_of(resp, time.perf_counter() - request_start)
 
             # 记录 Cookie（若有 set-cookie）
             try:
@@ -198,7 +368,7 @@ class SendRequest:
             try:
                 logs.info("响应码：%s", resp.status_code)
                 logs.info("响应耗时：%ss", round(resp.elapsed.total_seconds(), 3) if resp.elapsed else None)
-                logs.info("响应文本：%s", resp.text if resp.text else "<空响应体>")
+                logs.info("响应文本：%s", log_body(lambda: resp.text))
                 self._attach_response_to_allure(resp)
             except Exception:
                 pass
@@ -235,7 +405,7 @@ class SendRequest:
         cookies: Optional[Dict[str, Any]] = None,
         files: Optional[Dict[str, Any]] = None,
         **kwargs: Any,
-    ) -> requests.Response:
+    ) -> ResponseWrapper:
         """
         发起请求的入口。
         - 参数名 `file` 沿用旧代码；内部统一映射到 requests 的 `files`
@@ -247,17 +417,7 @@ class SendRequest:
         except Exception:
             pass
 
-        # 统一把请求参数作为一个 JSON 附件
-        try:
-            if kwargs:
-                allure.attach(
-                    json.dumps(kwargs, ensure_ascii=False, indent=2),
-                    name="请求参数",
-                    attachment_type=allure.attachment_type.JSON,
-                )
-                logs.info("请求参数：%s", json.dumps(kwargs, ensure_ascii=False))
-        except Exception:
-            pass
+        self._attach_params_to_allure(kwargs)
 
         # 透传到底层 send_request
         resp = self.send_request(
@@ -270,4 +430,10 @@ class SendRequest:
             verify=False,
             **kwargs,
         )
+        # 按接口名称汇总耗时，会话结束时输出到摘要和report/api_metrics.json
+        api_metrics.record(name, resp.timing, url=url)
         return resp
+
+
+session_pool = SessionPool()
+atexit.register(session_pool.close_all)
@@ -0,0 +1,176 @@
+import json
+
+import jsonpath
+
+from common.log_util import logs
+
+try:
+    # 可选依赖：安装了orjson时直接解析响应字节，速度明显快于标准库json
+    import orjson
+except ImportError:
+    orjson = None
+
+_UNSET = object()
+
+
+def loads(content, text=None):
+    """
+    解析JSON：优先用orjson解析UTF-8字节，orjson不支持的情况（非UTF-8编码、超出64位的整数等）回退到标准库
+    :param content: 响应体字节
+    :param text: 已解码的响应文本，回退到标准库时使用
+    :raise json.JSONDecodeError: 响应体不是合法JSON
+    """
+    if orjson is not None and content is not None:
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass
+    if text is None:
+        text = content.decode('utf-8', errors='replace') if isinstance(content, bytes) else content
+    return json.loads(text)
+
+
+class ResponseWrapper:
+    """
+    接口响应包装：
+    - 响应文本只解码一次、响应体只解析一次，结果缓存在对象上
+    - 同一个对象依次交给Allure附件、extract参数提取和断言使用，避免重复解析大响应体
+    - 常用属性与requests.Response一致，其余属性透传给原始响应
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._text = _UNSET
+        self._json = _UNSET
+        self._json_error = None
+        # 请求耗时和流量（metrics_util.RequestTiming），由发送请求的一方填写
+        self.timing = None
+
+    @classmethod
+    def from_text(cls, text):
+        """由响应文本构造，兼容直接传入字符串的旧调用方式"""
+        wrapper = cls(None)
+        wrapper._text = text or ''
+        return wrapper
+
+    @property
+    def content(self):
+        if self.raw is None:
+            return self._text.encode('utf-8')
+        return self.raw.content
+
+    @property
+    def text(self):
+        if self._text is _UNSET:
+            self._text = self.raw.text
+        return self._text
+
+    def json(self):
+        """
+        返回解析后的响应体，多次调用返回同一个对象（调用方不应修改）
+        :raise json.JSONDecodeError: 响应体不是合法JSON，失败结果同样被缓存
+        """
+        if self._json is _UNSET and self._json_error is None:
+            try:
+                encoding = (getattr(self.raw, 'encoding', None) or 'utf-8').lower().replace('_', '-')
+                # 只有UTF-8编码的响应才能直接交给orjson解析字节
+                content = self.content if encoding in ('utf-8', 'utf8') else None
+                self._json = loads(content, None if content is not None else self.text)
+            except json.JSONDecodeError as e:
+                self._json_error = e
+            except Exception as e:
+                logs.error(f'响应体JSON解析异常：{e}')
+                self._json_error = json.JSONDecodeError(str(e), '', 0)
+        if self._json_error is not None:
+            raise self._json_error
+        return self._json
+
+    @property
+    def body(self):
+        """解析后的响应体，非JSON响应返回None"""
+        try:
+            return self.json()
+        except json.JSONDecodeError:
+            return None
+
+    def __getattr__(self, item):
+        # status_code、headers、cookies、elapsed、url等属性透传给原始响应
+        if self.raw is None:
+            raise AttributeError(item)
+        return getattr(self.raw, item)
+
+
+def wrap_response(response):
+    """将requests.Response、AsyncResponse或响应文本统一为ResponseWrapper，已包装的对象原样返回"""
+    if isinstance(response, ResponseWrapper):
+        return response
+    if response is None or isinstance(response, str):
+        return ResponseWrapper.from_text(response)
+    return ResponseWrapper(response)
+
+
+# 含有这些字符的key会被jsonpath解释为表达式语法，由jsonpath库求值以保持原有结果
+_JSONPATH_SYNTAX = set('.[]*?()@$\'",: ')
+
+
+class ResponseIndex:
+    """
+    断言使用的响应索引，每个响应只构建一次：
+    - key索引：先序遍历响应体，得到 key -> [值]，与 jsonpath "$..key" 的结果及顺序一致，首次查询时才构建
+    - 响应头索引：精确匹配优先，其次大小写不敏感匹配（同名取第一个）
+    """
+
+    def __init__(self, body, headers=None):
+        self.body = body
+        self.headers = headers or {}
+        self._keys = None
+        self._lower_headers = None
+
+    def _build_keys(self):
+        index = {}
+        # 显式栈先序遍历：dict先记录本层全部key，再按顺序深入子节点
+        stack = [self.body]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, dict):
+                for key, value in node.items():
+                    index.setdefault(key, []).append(value)
+                children = node.values()
+            elif isinstance(node, list):
+                children = node
+            else:
+                continue
+            stack.extend(child for child in reversed(list(children)) if isinstance(child, (dict, list)))
+        return index
+
+    def find(self, key):
+        """返回响应体中所有名为key的值，未找到返回空列表"""
+        if not isinstance(self.body, (dict, list)):
+            return []
+        text = str(key)
+        if text.isdigit() or _JSONPATH_SYNTAX.intersection(text):
+            result = jsonpath.jsonpath(self.body, "$..%s" % key)
+            return result if isinstance(result, list) else []
+        if self._keys is None:
+            self._keys = self._build_keys()
+        return self._keys.get(text, [])
+
+    def header(self, key):
+        """大小写不敏感地读取响应头，未找到返回None"""
+        headers = self.headers
+        if isinstance(headers, dict):
+            if key in headers:
+                return headers[key]
+            if self._lower_headers is None:
+                self._lower_headers = {}
+                for header_key, header_value in headers.items():
+                    self._lower_headers.setdefault(str(header_key).lower(), header_value)
+            return self._lower_headers.get(str(key).lower())
+        try:
+            for candidate in (key, str(key).lower(), str(key).upper()):
+                value = headers.get(candidate)
+                if value is not None:
+                    return value
+        except Exception:
+            pass
+        return None
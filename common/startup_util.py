@@ -0,0 +1,77 @@
+import argparse
+import re
+import subprocess
+import sys
+
+from common.two_dimension_data import print_table
+from conf.setting import DIR_BASE
+
+# 默认统计pytest启动时加载的两个conftest，基本覆盖一次用例执行的全部框架导入
+DEFAULT_MODULES = ['conftest', 'testcase.conftest']
+# 数据库、SSH等连接器依赖，纯HTTP接口用例启动时不应出现在导入列表中
+HEAVY_MODULES = ['pandas', 'sqlalchemy', 'clickhouse_sqlalchemy', 'pymysql', 'pymongo', 'paramiko', 'redis']
+
+_IMPORT_TIME_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def measure_import_time(modules=None):
+    """
+    在子进程中以 python -X importtime 导入指定模块，解析每个模块的导入耗时
+    :param modules: 模块列表，默认为DEFAULT_MODULES
+    :return: [(模块名, 自身耗时us, 累计耗时us, 层级)]，按导入完成顺序排列
+    """
+    modules = modules or DEFAULT_MODULES
+    code = '; '.join(f'import {module}' for module in modules)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=DIR_BASE,
+                          capture_output=True, text=True, encoding='utf-8', errors='replace')
+    if proc.returncode != 0:
+        raise RuntimeError(f'导入{modules}失败：\n{proc.stderr}')
+    records = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORT_TIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            records.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return records
+
+
+def summarize(records, top=20):
+    """
+    汇总导入耗时：
+    - 总耗时取顶层模块（层级0）的累计耗时之和
+    - 按顶层包聚合自身耗时，列出最慢的top个
+    - 检查是否加载了HEAVY_MODULES中的连接器依赖
+    """
+    total_us = sum(cumulative for _, _, cumulative, level in records if level == 0)
+    packages = {}
+    for name, self_us, _, _ in records:
+        package = name.split('.')[0]
+        count, spent = packages.get(package, (0, 0))
+        packages[package] = (count + 1, spent + self_us)
+    slowest = sorted(packages.items(), key=lambda item: item[1][1], reverse=True)[:top]
+    loaded_heavy = [module for module in HEAVY_MODULES if module in packages]
+    return total_us, slowest, loaded_heavy
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='统计框架启动时的模块导入耗时（基于 python -X importtime）')
+    parser.add_argument('modules', nargs='*', help='需要统计的模块，默认为conftest和testcase.conftest')
+    parser.add_argument('--top', type=int, default=20, help='列出自身导入耗时最长的顶层包数量')
+    args = parser.parse_args(argv)
+
+    records = measure_import_time(args.modules)
+    total_us, slowest, loaded_heavy = summarize(records, args.top)
+
+    table = [['顶层包', '模块数', '自身耗时(ms)', '占比'], ['', '', '', '']]
+    for package, (count, spent) in slowest:
+        table.append([package, count, round(spent / 1000, 1), f'{spent / max(total_us, 1):.1%}'])
+    table.append(['', '', '', ''])
+    print_table(table)
+    print(f'导入模块总数：{len(records)}，总耗时：{round(total_us / 1000, 1)}ms')
+    if loaded_heavy:
+        print(f'启动时加载了连接器依赖：{", ".join(loaded_heavy)}，请检查是否存在模块级导入')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+import re
+import threading
+from functools import lru_cache
+
+from common.extract_util import ExtractUtil
+from common.log_util import logs
+
+# yaml用例中的函数占位符，如：${get_extract_data(goodsId,0)}
+_PLACEHOLDER = re.compile(r'\$\{(\w+)\((.*?)\)\}')
+
+
+class _Literal:
+    """不含占位符的常量节点"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def render(self):
+        return self.value
+
+
+class _Call:
+    """函数调用节点，编译时已解析出绑定方法和参数"""
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+
+    def render(self):
+        return self.func(*self.args)
+
+
+class _Concat:
+    """字符串中夹杂占位符，渲染后拼接为字符串"""
+    __slots__ = ('parts',)
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    def render(self):
+        return ''.join(part if isinstance(part, str) else _stringify(part.render()) for part in self.parts)
+
+
+class _Dict:
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+
+    def render(self):
+        return {key.render(): value.render() for key, value in self.items}
+
+
+class _List:
+    __slots__ = ('nodes',)
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def render(self):
+        return [node.render() for node in self.nodes]
+
+
+def _stringify(value):
+    """拼接进字符串时的取值规则，与原replace_load_yaml一致：列表以逗号连接"""
+    if value and isinstance(value, list):
+        return ','.join(str(e) for e in value)
+    return str(value)
+
+
+class TemplateEngine:
+    """
+    yaml用例占位符模板引擎：
+    - 每份用例数据只编译一次为渲染计划（常量片段 + 已解析的函数调用节点），按用例缓存
+    - 渲染时直接遍历dict/list结构，不再json序列化/反序列化
+    - 整个字符串就是一个占位符时保留函数返回值的原始类型
+    """
+
+    # 渲染计划缓存的上限，超出后整体清空，防止长时间运行时无限增长
+    max_plans = 4096
+
+    def __init__(self, util=None):
+        self.util = util or ExtractUtil()
+        self._plans = {}
+        self._lock = threading.Lock()
+        self._compile_str = lru_cache(maxsize=4096)(self._compile_str_uncached)
+
+    def _resolve(self, func_name, func_params):
+        try:
+            func = getattr(self.util, func_name)
+        except AttributeError:
+            logs.error(f'yaml占位符函数【{func_name}】不存在，请检查用例数据！')
+            raise
+        return _Call(func, tuple(func_params.split(',')) if func_params else ())
+
+    def _compile_str_uncached(self, text):
+        if '${' not in text:
+            return _Literal(text)
+        parts = []
+        last = 0
+        for match in _PLACEHOLDER.finditer(text):
+            if match.start() > last:
+                parts.append(text[last:match.start()])
+            parts.append(self._resolve(match.group(1), match.group(2)))
+            last = match.end()
+        if last < len(text):
+            parts.append(text[last:])
+        if not parts:
+            return _Literal(text)
+        if len(parts) == 1:
+            return parts[0] if isinstance(parts[0], _Call) else _Literal(parts[0])
+        return _Concat(tuple(parts))
+
+    def compile(self, data):
+        """
+        将yaml数据编译为渲染计划
+        :param data: yaml用例数据，dict/list/str或其他常量
+        :return: 渲染计划节点
+        """
+        if isinstance(data, str):
+            return self._compile_str(data)
+        if isinstance(data, dict):
+            return _Dict(tuple((self.compile(k), self.compile(v)) for k, v in data.items()))
+        if isinstance(data, (list, tuple)):
+            return _List(tuple(self.compile(item) for item in data))
+        return _Literal(data)
+
+    def _get_plan(self, data):
+        # 容器按对象缓存，同时保留对象引用，避免id被复用后命中错误的计划
+        key = id(data)
+        cached = self._plans.get(key)
+        if cached is not None and cached[0] is data:
+            return cached[1]
+        plan = self.compile(data)
+        with self._lock:
+            if len(self._plans) >= self.max_plans:
+                self._plans.clear()
+            self._plans[key] = (data, plan)
+        return plan
+
+    def render(self, data):
+        """
+        渲染yaml数据，例如将需要从extract.yaml文件中提取的参数进行替换
+        :param data: yaml用例数据
+        :return: 替换后的数据，dict/list返回新对象，不修改原始数据
+        """
+        if isinstance(data, (dict, list)):
+            return self._get_plan(data).render()
+        return self.compile(data).render()
+
+
+template_engine = TemplateEngine()
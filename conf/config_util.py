@@ -93,3 +93,92 @@ class OperationConfig:
         else:
             methods = [segment.strip().upper() for segment in str(raw_value).split(',') if segment.strip()]
         return methods or ['GET', 'POST', 'DELETE', 'PUT', 'TRACE']
+
+    def get_http_pool(self):
+        """获取HTTP连接池配置，未配置或非法时使用默认值"""
+        pool_conf = {'pool_connections': 10, 'pool_maxsize': 10, 'keep_alive': True}
+        if not self.conf.has_section('HTTP_POOL'):
+            return pool_conf
+        for option in ('pool_connections', 'pool_maxsize'):
+            raw_value = self.conf.get('HTTP_POOL', option, fallback='')
+            try:
+                pool_conf[option] = max(1, int(raw_value))
+            except (TypeError, ValueError):
+                pass
+        keep_alive = self.conf.get('HTTP_POOL', 'keep_alive', fallback='true')
+        pool_conf['keep_alive'] = str(keep_alive).strip().lower() in {"1", "true", "yes", "y", "on"}
+        return pool_conf
+
+    def get_async_concurrency(self):
+        """获取异步执行引擎的最大并发数，默认10"""
+        raw_value = self.conf.get('ASYNC', 'concurrency', fallback='')
+        try:
+            return max(1, int(raw_value))
+        except (TypeError, ValueError):
+            return 10
+
+    def get_mysql_pool(self):
+        """获取MySQL连接池配置，未配置或非法时使用默认值"""
+        pool_conf = {'maxsize': 5, 'timeout': 10.0, 'ping_interval': 30.0}
+        if not self.conf.has_section('MYSQL_POOL'):
+            return pool_conf
+        # (配置项, 类型, 最小值)
+        for option, cast, minimum in (('maxsize', int, 1), ('timeout', float, 0), ('ping_interval', float, 0)):
+            raw_value = self.conf.get('MYSQL_POOL', option, fallback='')
+            try:
+                pool_conf[option] = max(minimum, cast(raw_value))
+            except (TypeError, ValueError):
+                pass
+        return pool_conf
+
+    def get_allure_attach(self):
+        """获取Allure附件写入配置，未配置或非法时使用默认值"""
+        attach_conf = {'background': True, 'gzip_min_bytes': 0}
+        background = self.conf.get('ALLURE_ATTACH', 'background', fallback='true')
+        attach_conf['background'] = str(background).strip().lower() in {"1", "true", "yes", "y", "on"}
+        try:
+            attach_conf['gzip_min_bytes'] = max(0, int(self.conf.get('ALLURE_ATTACH', 'gzip_min_bytes', fallback='0')))
+        except (TypeError, ValueError):
+            pass
+        return attach_conf
+
+    def get_load_profile(self):
+        """获取压测模式(load_run.py)的默认参数，未配置或非法时使用默认值"""
+        profile = {'vus': 10, 'rate': 0.0, 'ramp_up': 0.0, 'duration': 60.0, 'setup': './data/loginName.yaml'}
+        if not self.conf.has_section('LOAD'):
+            return profile
+        # (配置项, 类型, 最小值)
+        for option, cast, minimum in (('vus', int, 1), ('rate', float, 0), ('ramp_up', float, 0), ('duration', float, 0)):
+            raw_value = self.conf.get('LOAD', option, fallback='')
+            try:
+                profile[option] = max(minimum, cast(raw_value))
+            except (TypeError, ValueError):
+                pass
+        profile['setup'] = self.conf.get('LOAD', 'setup', fallback=profile['setup']).strip()
+        return profile
+
+    def get_run_history_enabled(self):
+        """是否记录用例运行历史，默认记录"""
+        enable = self.conf.get('RUN_HISTORY', 'enable', fallback='true')
+        return str(enable).strip().lower() in {"1", "true", "yes", "y", "on"}
+
+    def get_perf_gate(self):
+        """获取性能回归门禁的阈值，未配置或非法时使用默认值"""
+        gate = {'percentile': 90.0, 'max_regression': 0.2, 'min_samples': 5, 'min_delta_ms': 5.0}
+        if not self.conf.has_section('PERF_GATE'):
+            return gate
+        # (配置项, 类型, 最小值)
+        for option, cast, minimum in (('percentile', float, 1), ('max_regression', float, 0),
+                                      ('min_samples', int, 1), ('min_delta_ms', float, 0)):
+            raw_value = self.conf.get('PERF_GATE', option, fallback='')
+            try:
+                gate[option] = max(minimum, cast(raw_value))
+            except (TypeError, ValueError):
+                pass
+        gate['percentile'] = min(gate['percentile'], 100.0)
+        return gate
+
+    def get_db_assert_mode(self):
+        """获取数据库断言的批量模式：immediate、case或scenario，默认case"""
+        mode = self.conf.get('DB_ASSERT', 'mode', fallback='case').strip().lower()
+        return mode if mode in ('immediate', 'case', 'scenario') else 'case'
@@ -6,8 +6,13 @@ DIR_BASE = os.path.dirname(os.path.dirname(__file__))
 sys.path.append(DIR_BASE)
 
 # log日志输出级别
-LOG_LEVEL = logging.DEBUG  # 文件
-STREAM_LOG_LEVEL = logging.DEBUG  # 控制台
+LOG_LEVEL = logging.INFO  # 文件
+STREAM_LOG_LEVEL = logging.INFO  # 控制台
+
+# 日志中请求参数、响应体的最大字符数，超出部分截断，0表示不截断
+LOG_BODY_MAX_CHARS = 2000
+# 响应体日志采样率，取值0~1，1表示每个响应都记录响应体，0.1表示约10%的响应记录响应体
+LOG_BODY_SAMPLE_RATE = 1.0
 
 # 接口超时时间，单位/s
 API_TIMEOUT = 60
@@ -26,6 +31,11 @@ FILE_PATH = {
     'TEMP': os.path.join(DIR_BASE, 'report/temp'),
     'TMR': os.path.join(DIR_BASE, 'report/tmreport'),
     'EXTRACT': os.path.join(DIR_BASE, 'extract.yaml'),
+    'EXTRACT_DB': os.path.join(DIR_BASE, 'extract.db'),
+    'CASE_CACHE': os.path.join(DIR_BASE, '.case_cache'),
+    'API_METRICS': os.path.join(DIR_BASE, 'report/api_metrics.json'),
+    'RUN_HISTORY': os.path.join(DIR_BASE, 'report/run_history.db'),
+    'PERF_BASELINE': os.path.join(DIR_BASE, 'data', 'perf_baseline.json'),
     'XML': os.path.join(DIR_BASE, 'data/sql'),
     'RESULTXML': os.path.join(DIR_BASE, 'report'),
     'EXCEL': os.path.join(DIR_BASE, 'data', '测试数据.xls')
@@ -1,38 +1,180 @@
 # -*- coding: utf-8 -*-
-import datetime
 import os
-import shutil
 import time
 import warnings
-from pathlib import Path
-from typing import Optional
 
 import pytest
 
 from base.remove_file import remove_file
-from common.parser_yaml import YmalParser
+from base.schedule_util import CaseScheduler
+from base.shard_util import MANIFEST_NAME, load_durations, split_items, write_manifest
+from common.extract_store import extract_store, reset_shared_store
+from common.parser_yaml import YmalParser, testcase_source
 from common.log_util import logs
-from common.email_util import SendEmail
+from common.attach_util import attach_writer
+from common.email_util import send_summary_email
+from common.history_util import RunHistory
+from common.metrics_util import api_metrics
+from common.requests_util import session_pool
 from conf import setting
 from conf.config_util import OperationConfig
 
 yfd = YmalParser()
 config_reader = OperationConfig()
+run_history = RunHistory() if config_reader.get_run_history_enabled() else None
+
+
+# 是否为pytest-xdist的worker进程
+def _is_xdist_worker(config):
+    return hasattr(config, 'workerinput')
+
+
+# 当前进程是否执行用例：xdist主进程只汇总worker的报告，不执行用例
+def _runs_tests(config):
+    return not config.pluginmanager.hasplugin('dsession')
 
 
 # === 每次运行测试前清理旧数据 ===
 @pytest.fixture(scope="session", autouse=True)
-def clear_extract():
+def clear_extract(request):
     # 禁用HTTPS告警，ResourceWarning
     warnings.simplefilter('ignore', ResourceWarning)
+    yield
+    # 会话结束时将内存中的关联数据落盘到extract.yaml，xdist运行时由各worker进程退出时落盘
+    if not _is_xdist_worker(request.config):
+        extract_store.checkpoint()
+
+
+# === 分片运行：多个CI节点各执行一部分用例，见base/shard_util.py ===
+def pytest_addoption(parser):
+    group = parser.getgroup('shard', '按历史耗时均衡的分片运行')
+    group.addoption('--shard-id', type=int, default=0, help='本节点执行的分片序号，从0开始')
+    group.addoption('--num-shards', type=int, default=1, help='分片总数，大于1时启用分片')
+    group.addoption('--shard-durations', default=None,
+                    help='用例历史耗时JSON（python -m common.history_util export导出），各节点需使用同一份文件，未指定时按用例数均分')
+
+
+def pytest_configure(config):
+    num_shards, shard_id = config.getoption('num_shards'), config.getoption('shard_id')
+    if num_shards < 1 or not 0 <= shard_id < num_shards:
+        raise pytest.UsageError(f'--shard-id需在0到{num_shards - 1}之间，--num-shards需不小于1')
 
-    yfd.clear_yaml_data()
-    remove_file("./report/temp", ['json', 'txt', 'attach', 'properties'])
 
+# 用例所属的依赖分组：yaml用例按extract依赖分组，其余用例按测试模块分组
+def _case_group(item, group_of):
+    callspec = getattr(item, 'callspec', None)
+    if callspec is not None:
+        for value in callspec.params.values():
+            source = testcase_source(value)
+            if source in group_of:
+                return group_of[source], True
+    return item.nodeid.split('::')[0], False
 
-# === 在会话开始时记录时间 ===
+
+# === pytest-xdist 分组：按extract依赖划分，互相依赖的用例文件分配到同一个worker；分片时同一分组的用例分配到同一分片 ===
+# tryfirst：需在xdist按xdist_group标记改写nodeid之前添加标记
+@pytest.hookimpl(tryfirst=True)
+def pytest_collection_modifyitems(session, config, items):
+    # 用例由xdist worker收集，只有通过-n启动的worker才需要按依赖分组，避免每次运行都扫描全部yaml
+    use_xdist = _is_xdist_worker(config)
+    num_shards = config.getoption('num_shards')
+    if not use_xdist and num_shards == 1:
+        return
+    group_of = CaseScheduler().group_of()
+    groups = []
+    for item in items:
+        group, from_yaml = _case_group(item, group_of)
+        if use_xdist and from_yaml:
+            item.add_marker(pytest.mark.xdist_group(name=group))
+        groups.append(group)
+    if num_shards > 1:
+        durations = load_durations(config.getoption('shard_durations'))
+        shard_id = config.getoption('shard_id')
+        selected, deselected = split_items(items, groups, durations, shard_id, num_shards)
+        # 分片清单与results.xml放在同一目录，merge时校验各分片的结果不重不漏
+        xml_path = getattr(config.option, 'xmlpath', None)
+        if xml_path:
+            write_manifest(os.path.join(os.path.dirname(os.path.abspath(xml_path)), MANIFEST_NAME),
+                           shard_id, num_shards, items, selected)
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
+
+
+# === 在会话开始时记录时间，并由主进程清理一次旧数据（xdist的worker不清理，避免互相清空） ===
+@pytest.hookimpl(tryfirst=True)
 def pytest_sessionstart(session):
     session.config._custom_session_start_time = time.time()
+    if run_history is not None and not session.config.option.collectonly:
+        try:
+            if _is_xdist_worker(session.config):
+                run_history.join_run()
+            else:
+                run_history.start_run()
+            run_history.record_cases = _runs_tests(session.config)
+        except Exception as exc:
+            logs.error('初始化运行历史失败: %s', exc)
+    # --collect-only（如IDE发现用例）不执行用例，保留上次运行的关联数据和报告
+    if not _is_xdist_worker(session.config) and not session.config.option.collectonly:
+        yfd.clear_yaml_data()
+        reset_shared_store()
+        remove_file("./report/temp", ['json', 'txt', 'attach', 'gz', 'properties'])
+
+
+# === 运行历史：call阶段开始记录本条用例的接口请求，logreport累计各阶段耗时 ===
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_call(item):
+    if run_history is not None:
+        api_metrics.start_case()
+
+
+def pytest_runtest_logreport(report):
+    if run_history is not None:
+        run_history.add_report(report)
+
+
+# === allure在自己的pytest_runtest_logfinish中写入用例结果，tryfirst保证先等待后台线程写完本条用例的附件 ===
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_logfinish(nodeid, location):
+    attach_writer.flush()
+    if run_history is not None:
+        run_history.finish_case(nodeid, api_metrics.pop_case())
+
+
+# === 接口耗时和连接池统计：xdist的worker在会话结束时上报，主进程汇总后输出；运行历史在会话结束时批量写入 ===
+def pytest_sessionfinish(session):
+    if _is_xdist_worker(session.config):
+        session.config.workeroutput['api_metrics'] = api_metrics.to_dict()
+        session.config.workeroutput['pool_stats'] = session_pool.stats()
+    if run_history is not None:
+        try:
+            run_history.flush()
+            if not _is_xdist_worker(session.config):
+                run_history.finish_run(session.testscollected, session.testsfailed)
+        except Exception as exc:
+            logs.error('写入运行历史失败: %s', exc)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_testnodedown(node, error):
+    workeroutput = getattr(node, 'workeroutput', {})
+    api_metrics.merge(workeroutput.get('api_metrics'))
+    session_pool.merge_stats(workeroutput.get('pool_stats'))
+
+
+# 接口耗时JSON与--junitxml指定的results.xml放在同一目录，未指定时写入report/api_metrics.json
+def _write_api_metrics(config):
+    if not api_metrics.apis:
+        return
+    xml_path = getattr(config.option, 'xmlpath', None)
+    if xml_path:
+        path = os.path.join(os.path.dirname(os.path.abspath(xml_path)), 'api_metrics.json')
+    else:
+        path = setting.FILE_PATH['API_METRICS']
+    try:
+        api_metrics.dump(path)
+    except OSError as exc:
+        logs.error('写入接口耗时统计失败: %s', exc)
 
 
 # 获取测试会话的开始时间
@@ -74,6 +216,13 @@ def generate_test_summary(terminalreporter):
         f"跳过执行数量：{len(skipped_reports)}",
         f"执行总时长：{duration:.2f}(秒)",
     ]
+    for host, host_stats in session_pool.stats().items():
+        summary_lines.append(
+            f"连接池[{host}]：请求数{host_stats['requests']}，新建连接{host_stats['opened']}，复用连接{host_stats['reused']}")
+    metrics_lines = api_metrics.summary_lines()
+    if metrics_lines:
+        summary_lines.append("接口耗时（按p90从高到低）：")
+        summary_lines.extend(metrics_lines)
     summary = "\n".join(summary_lines)
     print(summary)
 
@@ -98,55 +247,12 @@ def _parse_bool(value):
     return str(value).strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
-# 检查是否启用邮件发送功能
-def _should_send_email() -> bool:
-    enable_str = config_reader.get_section_for_data('EMAIL', 'enable')
-    enable_flag = str(enable_str).strip().lower() in {"1", "true", "yes", "y", "on"}
-    return enable_flag
-
-
-# 构建测试报告附件
-def _build_report_attachment() -> Optional[str]:
-    if setting.REPORT_TYPE == 'allure':
-        allure_dir = Path(setting.FILE_PATH['TEMP'])
-        if not allure_dir.exists() or not any(allure_dir.iterdir()):
-            return None
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        archive_base = allure_dir.parent / f"{allure_dir.name}_{timestamp}"
-        archive_path = shutil.make_archive(str(archive_base), 'zip', allure_dir)
-        return archive_path
-    if setting.REPORT_TYPE == 'tm':
-        report_file = Path(setting.FILE_PATH['TMR']) / 'testReport.html'
-        if report_file.exists():
-            return str(report_file)
-    return None
-
-
-# 发送测试报告邮件
-def _send_summary_email(summary: str):
-    if not _should_send_email():
-        return
-
-    attachment = _build_report_attachment()
-    attachments = [attachment] if attachment else None
-    subject = config_reader.get_section_for_data('EMAIL', 'subject') or '接口自动化测试报告'
-
-    try:
-        sender = SendEmail()
-        sender.build_content(subject, summary, atta_file=attachments)
-    except Exception as exc:  # pragma: no cover - 不影响测试用例执行
-        logs.error('发送测试报告邮件失败: %s', exc, exc_info=True)
-    finally:
-        if attachment and attachment.endswith('.zip') and os.path.exists(attachment):
-            try:
-                os.remove(attachment)
-            except OSError:
-                logs.warning('临时报告压缩包删除失败: %s', attachment)
-
-
 # 注册pytest钩子函数，在测试会话结束时打印摘要信息
 def pytest_terminal_summary(terminalreporter, exitstatus, config):
     """自动收集pytest框架执行的测试结果并打印摘要信息"""
     time.sleep(0.5) # 睡眠0.5秒，确保summary最后打印
     summary = generate_test_summary(terminalreporter)
-    _send_summary_email(summary)
+    _write_api_metrics(config)
+    # 分片运行时由 python -m base.shard_util merge 合并各分片结果后统一发送邮件
+    if config.getoption('num_shards') == 1:
+        send_summary_email(summary)
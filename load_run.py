@@ -0,0 +1,42 @@
+import argparse
+import logging
+import sys
+
+from base.api_util import RequestBase
+from base.load_util import LoadRunner, load_units
+from common.log_util import logs
+from common.parser_yaml import get_testcase_yaml
+from common.requests_util import session_pool
+from conf.config_util import OperationConfig
+
+
+def main(argv=None):
+    profile = OperationConfig().get_load_profile()
+    parser = argparse.ArgumentParser(description='以目标速率重放yaml接口用例进行压测，默认参数取自config.ini的[LOAD]')
+    parser.add_argument('files', nargs='+', help='yaml用例文件，业务流文件（如BusinessScenario.yml）整体作为一次迭代')
+    parser.add_argument('-k', '--keyword', help='只压测接口名称或用例名称包含该关键字的单接口用例')
+    parser.add_argument('--vus', type=int, default=profile['vus'], help='虚拟用户数，即最大并发迭代数')
+    parser.add_argument('--rate', type=float, default=profile['rate'], help='每秒发起的迭代数，0表示每个虚拟用户循环执行')
+    parser.add_argument('--ramp-up', type=float, default=profile['ramp_up'], help='爬坡秒数')
+    parser.add_argument('--duration', type=float, default=profile['duration'], help='持续秒数')
+    parser.add_argument('--setup', default=profile['setup'], help='压测前执行一次的前置用例（如登录），传空字符串表示不执行')
+    parser.add_argument('--verbose', action='store_true', help='输出每个请求的INFO日志，默认只输出WARNING及以上')
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        logs.setLevel(logging.WARNING)
+    # 前置用例会创建共享Session，先按虚拟用户数设置连接池大小
+    session_pool.ensure_pool_maxsize(args.vus)
+    if args.setup:
+        for base_info, test_case in get_testcase_yaml(args.setup):
+            RequestBase().specification_yaml(base_info, test_case)
+
+    runner = LoadRunner(load_units(args.files, args.keyword), vus=args.vus, rate=args.rate,
+                        ramp_up=args.ramp_up, duration=args.duration)
+    stats = runner.run()
+    runner.print_summary()
+    return 1 if stats.failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
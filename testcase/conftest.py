@@ -31,10 +31,11 @@ def datadb_init():
     数据库可以预先预置一批本次测试的数据，在测试完成之后将这批数据清理，就不会对系统造成影响，也不会产生脏数据
     :return:
     """
+    # ConnectMysql使用会话共享的连接池，SQL参数使用%s占位符
     # conn = ConnectMysql()
     # yield
-    # sql = "delete from sys_user where login_name='test999'"
-    # conn.delete(sql)
+    # sql = "delete from sys_user where login_name=%s"
+    # conn.delete(sql, ('test999',))
     # allure.attach('将测试数据清空', 'fixture后置', allure.attachment_type.TEXT)
 
     pass